@@ -0,0 +1,216 @@
+# Tangram Puzzle: Generator Benchmarks
+#
+# (c) 2025 ralfoide at gmail
+#
+# Times the generator hot paths and the enumeration of fixed sub-problems, and compares
+# the results with a baseline: the solution counts must match exactly, the times are
+# only reported. Run from the analyzer directory, preferably with python -O:
+#   python -O bench/bench_gen.py -b bench/baseline.json -o data/output/bench.json
+
+import argparse
+import contextlib
+import gc
+import io
+import json
+import os
+import platform
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import coord
+import gen
+from gen import Generator, EXACT_COVER_SOLVERS, PX_CELL_SIZE
+
+# A known solution. The sub-problems fix some of its pieces and search the rest.
+SOLUTION = "HR@0:2x0x0,i2@0:4x1x1,W2@180:1x2x1,P2@300:1x0x0,VB@180:4x5x1,J2@180:2x2x1,L1@300:1x3x1,TW@0:0x2x0,TO@180:5x3x1,TY@60:4x4x1,TY@120:2x4x0"
+
+# Number of pieces of SOLUTION fixed by each enumeration sub-problem.
+# The exact cover solvers fix the placements of these pieces, the perm solver only
+# fixes their chirality and rotation (the permutation prefix) and searches all the
+# placements, which is why it needs more pieces fixed to run in a few seconds.
+ENUM_FIXED_PLACEMENTS = 2
+ENUM_FIXED_ROTATIONS = 9
+
+# Transposition table size in MB of the enum_perm_memo case, see gen.GEN_MEMO_SIZE.
+# The enum_perm case runs without the table, as by default.
+ENUM_MEMO_SIZE = 64
+
+# Time ratio above which a case is reported as slower than the baseline.
+SLOWER_RATIO = 1.10
+
+
+class Bench:
+    def __init__(self, repeat:int):
+        self.repeat = repeat
+        self.g = Generator(os.devnull)
+        self.g.report_file = io.StringIO()
+        with contextlib.redirect_stdout(io.StringIO()):
+            self.g.size_px, self.g.yrg_coords, self.cells_empty = self.g.create_cells(PX_CELL_SIZE)
+            self.g.precompute_positions(self.cells_empty)
+        self.placed = []
+        for p in SOLUTION.split(","):
+            name, pos = p.split("@")
+            angle, pos = pos.split(":")
+            y_abs, r_abs, g = pos.split("x")
+            self.placed.append( (name, int(angle), int(y_abs), int(r_abs), int(g)) )
+        self.variants = [ self.g.find_piece_info(name, angle)
+                          for key, properties in gen.PIECES.items()
+                          for name in properties.get("name", [ key ])
+                          for angle in range(0, properties.get("rot", 300) + 1, 60) ]
+
+    def run(self, name:str, fn) -> dict:
+        """
+        Calls fn() repeat times and returns the minimum CPU time and the count returned by fn(),
+        which must be the same for each call. As with timeit, the garbage collector is
+        disabled while timing.
+        """
+        best = None
+        count = None
+        for _ in range(self.repeat):
+            gc.collect()
+            gc.disable()
+            try:
+                ts = time.process_time()
+                with contextlib.redirect_stdout(io.StringIO()):
+                    result = fn()
+                seconds = time.process_time() - ts
+            finally:
+                gc.enable()
+            if count is not None and result != count:
+                raise RuntimeError(f"{name}: count {result} differs from the previous run {count}")
+            count = result
+            best = seconds if best is None else min(best, seconds)
+        print(f"{name:24s} {best:9.4f} s  count {count}")
+        return { "seconds": best, "count": count }
+
+    def boards(self) -> list:
+        """Returns the boards of SOLUTION with 0 to all its pieces placed."""
+        boards = [ self.cells_empty ]
+        for i in range(1, len(self.placed) + 1):
+            boards.append(self.g.placed_cells(self.cells_empty, self.placed[:i], 0))
+        return boards
+
+    def bench_place_piece(self) -> int:
+        count = 0
+        for cells in self.boards() * 2:
+            for piece_info in self.variants:
+                piece_cells = piece_info["cells"]
+                angle = piece_info["angle"]
+                for y in range(-coord.N2, coord.N2 + 1):
+                    for r in range(-coord.N2, coord.N2 + 1):
+                        if self.g._place_piece(cells, piece_cells, piece_info, y, r, angle) is not None:
+                            count += 1
+        return count
+
+    def bench_rotate_piece_cells(self) -> int:
+        count = 0
+        for _ in range(200):
+            self.g.rot_cache.clear()
+            for piece_info in self.variants:
+                yrg_rot, g_count = self.g.rotate_piece_cells(piece_info["cells"], piece_info, piece_info["angle"])
+                count += len(yrg_rot)
+        return count
+
+    def bench_adjacents_cells(self) -> int:
+        count = 0
+        for _ in range(200):
+            self.g.adjacents_cache.clear()
+            for piece_info in self.variants:
+                yrg_rot, _ = self.g.rotate_piece_cells(piece_info["cells"], piece_info, piece_info["angle"])
+                count += len(self.g.adjacents_cells(yrg_rot, piece_info, piece_info["angle"]))
+        return count
+
+    def bench_is_cell_surrounded(self) -> int:
+        count = 0
+        boards = self.boards()
+        for _ in range(400):
+            for cells in boards:
+                for y_abs, r_abs, g in coord.VALID_YRG:
+                    if self.g.is_cell_surrounded(y_abs, r_abs, g, cells):
+                        count += 1
+        return count
+
+    def bench_enum_exact_cover(self, solver_name:str) -> int:
+        rows, copies = self.g.exact_cover_rows()
+        solver = EXACT_COVER_SOLVERS[solver_name](rows, copies)
+        for name, angle, y_abs, r_abs, g in self.placed[:ENUM_FIXED_PLACEMENTS]:
+            mask = self.g.placed_cells(self.cells_empty, [ (name, angle, y_abs, r_abs, g) ], 0).mask
+            row = next(row for row, (_, _, piece_info, _, _, _, row_mask) in enumerate(rows)
+                       if name in piece_info["names"] and row_mask == mask)
+            solver.select(row)
+        return sum(1 for _ in solver.solve())
+
+    def bench_enum_perm(self, memo_size:int) -> int:
+        self.g.memo.clear()
+        self.g.memo_bytes = 0
+        self.g.memo_size = memo_size
+        prefix = [ self.g.find_piece_info(name, angle) for name, angle, _, _, _ in self.placed[:ENUM_FIXED_ROTATIONS] ]
+        return sum(1 for _ in self.g.gen_all_solutions(self.cells_empty, 1, 0, 1, prefix))
+
+    def run_all(self) -> dict:
+        return {
+            "place_piece": self.run("place_piece", self.bench_place_piece),
+            "rotate_piece_cells": self.run("rotate_piece_cells", self.bench_rotate_piece_cells),
+            "adjacents_cells": self.run("adjacents_cells", self.bench_adjacents_cells),
+            "is_cell_surrounded": self.run("is_cell_surrounded", self.bench_is_cell_surrounded),
+            "enum_dlx": self.run("enum_dlx", lambda: self.bench_enum_exact_cover("dlx")),
+            "enum_cells": self.run("enum_cells", lambda: self.bench_enum_exact_cover("cells")),
+            "enum_perm": self.run("enum_perm", lambda: self.bench_enum_perm(0)),
+            "enum_perm_memo": self.run("enum_perm_memo", lambda: self.bench_enum_perm(ENUM_MEMO_SIZE)),
+        }
+
+
+def compare(results:dict, baseline:dict) -> bool:
+    """Prints the time ratio of each case against the baseline. Returns false if any count differs."""
+    ok = True
+    print("------")
+    for name, base in baseline["results"].items():
+        result = results.get(name)
+        if result is None:
+            print(f"{name:24s} missing")
+            continue
+        if result["count"] != base["count"]:
+            print(f"{name:24s} COUNT MISMATCH {result['count']} != {base['count']}")
+            ok = False
+            continue
+        ratio = result["seconds"] / base["seconds"] if base["seconds"] > 0 else 0
+        status = "slower" if ratio > SLOWER_RATIO else ""
+        print(f"{name:24s} {ratio:6.2f}x  {status}")
+    return ok
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Tangram Puzzle Generator Benchmarks")
+    parser.add_argument("-r", "--repeat",
+        type=int,
+        default=3,
+        help="Number of runs of each case, the fastest one is kept")
+    parser.add_argument("-o", "--output",
+        help="JSON file to write the results to")
+    parser.add_argument("-b", "--baseline",
+        help="JSON results to compare with")
+    args = parser.parse_args()
+
+    if __debug__: print("Note: run with python -O for representative timings")
+    results = {
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "debug": __debug__,
+        "repeat": args.repeat,
+        "results": Bench(args.repeat).run_all(),
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"Results: {args.output}")
+    if args.baseline:
+        with open(args.baseline, "r") as f:
+            baseline = json.load(f)
+        if not compare(results["results"], baseline):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -5,6 +5,7 @@
 import math
 import numpy as np
 
+from collections import namedtuple
 from typing import Generator
 from typing import Tuple
 
@@ -61,10 +62,28 @@ ROT_60_CCW_SRC = [
 
 ROT_60_CCW_SRC_TO_IDX = {}
 
-class XY:
-    def __init__(self, a:np.array):
-        self.x = a[0]
-        self.y = a[1]
+# We can mirror the puzzle cells along the vertical axis by mapping any cell from MIRROR_V_SRC (source) to VALID_YRG (destination).
+# This simply reverses each line, and mirroring twice gives back the original cells.
+MIRROR_V_SRC = [
+                          (0, 3, 0), (0, 2, 1), (0, 2, 0), (0, 1, 1), (0, 1, 0), (0, 0, 1), (0, 0, 0),
+               (1, 4, 0), (1, 3, 1), (1, 3, 0), (1, 2, 1), (1, 2, 0), (1, 1, 1), (1, 1, 0), (1, 0, 1), (1, 0, 0),
+    (2, 5, 0), (2, 4, 1), (2, 4, 0), (2, 3, 1), (2, 3, 0), (2, 2, 1), (2, 2, 0), (2, 1, 1), (2, 1, 0), (2, 0, 1), (2, 0, 0),
+    (3, 5, 1), (3, 5, 0), (3, 4, 1), (3, 4, 0), (3, 3, 1), (3, 3, 0), (3, 2, 1), (3, 2, 0), (3, 1, 1), (3, 1, 0), (3, 0, 1),
+               (4, 5, 1), (4, 5, 0), (4, 4, 1), (4, 4, 0), (4, 3, 1), (4, 3, 0), (4, 2, 1), (4, 2, 0), (4, 1, 1),
+                          (5, 5, 1), (5, 5, 0), (5, 4, 1), (5, 4, 0), (5, 3, 1), (5, 3, 0), (5, 2, 1),
+]
+
+# XY, YRG and Triangle are immutable tuples: they are created by the thousands per image
+# and per rendered solution, and compared or hashed (e.g. as dict keys) by value.
+
+class XY(namedtuple("XY", "x y")):
+    __slots__ = ()
+
+    def __new__(cls, a:np.array):
+        return tuple.__new__(cls, (a[0], a[1]))
+
+    def __getnewargs__(self) -> Tuple:
+        return (tuple(self),)
 
     def __str__(self) -> str:
         return f"({self.x}, {self.y})"
@@ -86,18 +105,21 @@ class XY:
         return math.sqrt(dx * dx + dy * dy)
 
 
-class YRG:
-    def __init__(self, y_piece:int, r_piece:int, g_piece:int):
-        """
-        Y/R must be "relative" coordinates in range [-N/2 to N/2[.
-        G must be a pseudo-coordinate either 0 or 1.
-        """
-        self.y = y_piece
-        self.r = r_piece
-        self.g = g_piece
+class YRG(namedtuple("YRG", "y r g")):
+    """
+    Y/R must be "relative" coordinates in range [-N/2 to N/2[.
+    G must be a pseudo-coordinate either 0 or 1.
+    This is not validated by YRG() as most coordinates come from VALID_YRG, see checked().
+    """
+    __slots__ = ()
+
+    @classmethod
+    def checked(cls, y_piece:int, r_piece:int, g_piece:int) -> "YRG":
+        """Same as YRG() for computed coordinates, validating their range."""
         assert -N2 <= y_piece < N2, f"Invalid Y piece: {y_piece}"
         assert -N2 <= r_piece < N2, f"Invalid R piece: {r_piece}"
         assert g_piece == 0 or g_piece == 1, f"Invalid g_piece: {g_piece}"
+        return cls(y_piece, r_piece, g_piece)
 
     def __str__(self) -> str:
         return f"({self.y}, {self.r}, {self.g})"
@@ -105,9 +127,6 @@ class YRG:
     def __repr__(self) -> str:
         return f"YRG({self.y}, {self.r}, {self.g})"
 
-    def __eq__(self, other:"YRG") -> bool:
-        return self.y == other.y and self.r == other.r and self.g == other.g
-
     def add(self, y_piece:int, r_piece:int) -> "YRG":
         """
         Return the offset of this coordinate by +Y/+R.
@@ -120,17 +139,21 @@ class YRG:
         """
         y2 = self.y + y_piece
         r2 = self.r + r_piece
-        return YRG(y2, r2, self.g)
+        return YRG.checked(y2, r2, self.g)
 
     def to_abs(self) -> Tuple:
         return self.y + N2, self.r + N2, self.g
 
 
 
-class Triangle:
-    def __init__(self, yrg_piece:YRG, p0:XY, p1:XY, p2:XY):
-        self.yrg = yrg_piece
-        self.xy_list = [p0, p1, p2]
+class Triangle(namedtuple("Triangle", "yrg xy_list")):
+    __slots__ = ()  # xy_list is a tuple of 3 XY
+
+    def __new__(cls, yrg_piece:YRG, p0:XY, p1:XY, p2:XY):
+        return tuple.__new__(cls, (yrg_piece, (p0, p1, p2)))
+
+    def __getnewargs__(self) -> Tuple:
+        return (self.yrg, *self.xy_list)
 
     def to_np_array(self) -> np.array:
         return np.array([ xy.to_np() for xy in self.xy_list ])
@@ -167,6 +190,20 @@ class Triangle:
         return Triangle(self.yrg, *new_xy_list)
 
 
+def lattice_adjacents(y:int, r:int, g:int) -> list[Tuple]:
+    """
+    Returns the left, right, and up or down neighbors of a (y, r, g) cell.
+    This works the same for relative or absolute coordinates since it does not check
+    whether the neighbors are within the puzzle boundaries.
+    """
+    gl = 1 - g
+    rl = r - 1 if g == 0 else r
+    rr = r + 1 if g == 1 else r
+    # Up or Down (can't have both)
+    up_down = (y - 1, r, 0) if g == 1 else (y + 1, r, 1)
+    return [ (y, rl, gl), (y, rr, gl), up_down ]
+
+
 def segments(polygon_points:list) -> Generator:
     np = len(polygon_points)
     for i in range(np):
@@ -271,6 +308,44 @@ class Axis:
         return XY( ( int(cx), int(cy)) )
 
 
+class Geometry:
+    """
+    The geometry of all the board cells of one YRGCoord, in the VALID_YRG order.
+    This is computed once by YRGCoord.geometry() and must not be modified: the triangles
+    are shared and the arrays are read-only.
+    """
+    def __init__(self, yrg_coords:"YRGCoord"):
+        polygons, centers = yrg_coords.triangles_np()
+        self.triangles = tuple(yrg_coords.triangles())
+        # Pixel polygons as used by cv2.fillPoly/polylines, and one view per cell.
+        self.polygons = np.int32(polygons)
+        self.polygons.setflags(write=False)
+        self.cell_polygons = tuple(self.polygons)
+        self.centers = centers
+        self.centers.setflags(write=False)
+        self.centers_int = tuple( (int(x), int(y)) for x, y in centers.tolist() )
+        self.radii = tuple( t.inscribed_circle_radius() for t in self.triangles )
+        # Absolute (y, r, g) of each cell.
+        self.yrg_abs = tuple(VALID_YRG)
+        self._sample_rects = {}
+
+    def center_radius(self) -> float:
+        """Returns the inscribed circle radius of the center cell YRG(0, 0, 0)."""
+        return self.radii[VALID_YRG_TO_IDX[ (N2, N2, 0) ]]
+
+    def sample_rects(self, ratio:float) -> tuple:
+        """
+        Returns the (x1, y1, x2, y2) square around the center of each cell, with a half size
+        of ratio * center_radius(), used to sample the cell colors.
+        """
+        rects = self._sample_rects.get(ratio)
+        if rects is None:
+            radius = int(self.center_radius() * ratio)
+            rects = tuple( (cx - radius, cy - radius, cx + radius, cy + radius) for cx, cy in self.centers_int )
+            self._sample_rects[ratio] = rects
+        return rects
+
+
 class YRGCoord:
     def __init__(self, center_px:Tuple[float, float], y_axis:Axis, r_axis:Axis):
         """
@@ -290,6 +365,7 @@ class YRGCoord:
         self.axes_center = XY(segment_center( ( py.to_int(), pr.to_int() ) ))
 
         self.radials, self.radials_center_px = self.compute_distortion(y_axis, r_axis)
+        self._geometry = None
 
         global VALID_YRG_TO_IDX, ROT_60_CCW_SRC_TO_IDX, VALID_YRG_ADJACENTS
         if not VALID_YRG_TO_IDX:
@@ -411,6 +487,82 @@ class YRGCoord:
 
         return XY((x, y))
 
+    def points_yr_np(self, y_pieces:np.array, r_pieces:np.array) -> np.array:
+        """
+        Same as point_yr() for arrays of Y/R coordinates of the same shape.
+        Returns an array of that shape + (2,) with the x, y pixel coordinates.
+        """
+        Y = self.y_axis
+        R = self.r_axis
+        ux = y_pieces * Y.u.x + r_pieces * R.u.x
+        uy = y_pieces * Y.u.y + r_pieces * R.u.y
+        angle_rad = np.arctan2(uy, ux)
+        length = np.sqrt(ux * ux + uy * uy)
+
+        # Same as radial_unit(): bring the angles in [360, 720[ then modulo 360.
+        angle_deg = np.degrees(-angle_rad)
+        angle_deg = np.where(angle_deg < 0, (angle_deg + 360) + 360, angle_deg + 360)
+        angle_deg = np.mod(angle_deg, 360)
+        index_before = (angle_deg // 60).astype(int) % 6
+        index_after = ((angle_deg + 60) // 60).astype(int) % 6
+        factor = 1 - (angle_deg - index_before * 60) / 60
+        radials_len = np.array([ self.radials[angle]["len"] for angle in range(0, 360, 60) ])
+        radials_deg = np.array([ self.radials[angle]["deg"] for angle in range(0, 360, 60) ])
+        unit_length = radials_len[index_before] * factor + radials_len[index_after] * (1 - factor)
+        real_angle_before = radials_deg[index_before]
+        real_angle_after = radials_deg[index_after]
+        real_angle_after = np.where(real_angle_after < real_angle_before, real_angle_after + 360, real_angle_after)
+        adjusted_angle_deg = real_angle_before * factor + real_angle_after * (1 - factor)
+        unit_rad = np.radians(-adjusted_angle_deg)
+
+        x = self.radials_center_px.x + length * (unit_length * np.cos(unit_rad))
+        y = self.radials_center_px.y + length * (unit_length * np.sin(unit_rad))
+        return np.stack([ x, y ], axis=-1)
+
+    def lattice_np(self) -> np.array:
+        """
+        Returns the pixel coordinates of all the lattice vertices as an array of
+        shape (N+1, N+1, 2), indexed by [y_piece + N2, r_piece + N2].
+        """
+        y_pieces, r_pieces = np.meshgrid(np.arange(-N2, N2 + 1), np.arange(-N2, N2 + 1), indexing="ij")
+        return self.points_yr_np(y_pieces, r_pieces)
+
+    def triangles_np(self) -> Tuple[np.array, np.array]:
+        """
+        Computes the geometry of all the cells of the board in one pass.
+        Returns the triangle polygons as an array of shape (NUM_CELLS, 3, 2) and their
+        centers as an array of shape (NUM_CELLS, 2), both in the VALID_YRG order.
+        The polygon points are in the same order as in triangle().
+        """
+        lattice = self.lattice_np()
+        yrg = np.array(VALID_YRG)
+        y_abs, r_abs, g = yrg[:, 0], yrg[:, 1], yrg[:, 2]
+        # G=0 uses the rhombus points 0, 1, 2 and G=1 the points 0, 2, 3.
+        p1_y = y_abs + 1
+        p1_r = r_abs + g
+        polygons = np.stack([
+            lattice[y_abs, r_abs],
+            lattice[p1_y, p1_r],
+            lattice[y_abs + 1 - g, r_abs + 1],
+        ], axis=1)
+        centers = polygons.sum(axis=1) / 3
+        return polygons, centers
+
+    def triangles(self) -> list[Triangle]:
+        """Returns the Triangle of each cell in the VALID_YRG order, computed by triangles_np()."""
+        polygons, _ = self.triangles_np()
+        triangles = []
+        for (y, r, g), polygon in zip(VALID_YRG, polygons):
+            p0, p1, p2 = [ XY(p) for p in polygon.tolist() ]
+            triangles.append(Triangle(YRG(y - N2, r - N2, g), p0, p1, p2))
+        return triangles
+
+    def geometry(self) -> Geometry:
+        """Returns the geometry of all the cells, computed on the first call."""
+        if self._geometry is None:
+            self._geometry = Geometry(self)
+        return self._geometry
+
     def rhombus(self, y_piece:int, r_piece:int) -> list[XY]:
         """Compute the rhombus points."""
         p0 = self.point_yr(y_piece    , r_piece)
@@ -439,8 +591,7 @@ class YRGCoord:
         except ValueError:
             print(f"Error: Invalid coordinate {yrg_abs}")
             raise
-        yrg_dst = VALID_YRG[index]
-        return self.triangle(YRG(yrg_dst[0] - N2, yrg_dst[1] - N2, yrg_dst[2]))
+        return self.geometry().triangles[index]
 
     def rot_60_ccw_yrg(self, y_piece:int, r_piece:int, g_piece:int) -> Tuple:
         # Raises ValueError if the YRG coordinate is invalid.
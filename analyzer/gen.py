@@ -4,16 +4,27 @@
 #
 # Note: run with python -O or -OO to disable __debug__ sections.
 
+import collections
 import colors
+import contextlib
 import coord
 import cv2
+import heapq
+import json
 import math
+import multiprocessing
 import numpy as np
 import os
+import re
+import struct
+import sys
+import tempfile
 import time
+import zlib
 
-from coord import Axis, XY, YRG, YRGCoord
+from coord import Axis, XY, YRGCoord
 from img_proc import Cell
+from metrics import GenMetrics, GEN_METRICS_INTERVAL
 from typing import Generator as TGenerator
 from typing import Tuple
 
@@ -21,10 +32,78 @@ N2 = coord.N2
 DEBUG_PIECE=-1
 DEBUG_SAVE=False
 
+# Size of the subtrees handed out to worker processes by Generator.gen_parallel():
+# number of pieces fixed in each "perm" task, and of placements in each exact cover task.
+GEN_TASK_PERM_DEPTH = 4
+GEN_TASK_DLX_DEPTH = 2
+
+# Transposition table of the "perm" solver, see Generator.memo_tails(): maximum estimated
+# size of its entries in MB per process, maximum number of pieces left to place for a
+# sub-search to be memoized, and maximum number of boards kept while filling one entry.
+# Each entry is filled for all the rotations of the remaining pieces, which only pays off
+# when the run goes through most of their permutations, so the table is disabled by
+# default: --gen-memo 64 is meant for long full runs.
+GEN_MEMO_SIZE = 0
+GEN_MEMO_PIECES = 9
+GEN_MEMO_BOARDS = 65536
+MEMO_DEAD_END = {}
+
+# The TW piece only has one rotation, TW@0, which already excludes the rotated copies of
+# each solution. The vertical mirror maps TW@0 onto itself, so the mirror image of a solution
+# is another solution: with --gen-symmetry the exact cover only keeps the placements of this
+# piece whose mask is not greater than their mirrored mask. The search branches on this piece
+# first (see Generator.exact_cover_solver()), so that only half of the root branches are
+# searched, instead of pruning the mirrored placements wherever the piece gets chosen.
+SYMMETRY_PIECE = "HR"
+
+# Checkpoints of the generator search, see Generator.save_checkpoint().
+CHECKPOINT_VERSION = 4
+CHECKPOINT_SECONDS = 60
+CHECKPOINT_COUNTERS = [
+    "img_count", "sol_count", "report_count", "perm_count", "gen_count", "gen_failed",
+    "reject_g_count", "reject_yrg_invalid", "reject_occupied", "reject_adjacents", "reject_dead_region",
+]
+
 PX_CELL_SIZE = 30
 INVALID_CELL = "INVALID"
 EMPTY_CELL = "EMPTY"
 
+# Bitboard bit N is the cell coord.VALID_YRG[N]. This maps it to its index in Cells.colors.
+BIT_TO_COLOR_IDX = [ 2 * coord.N * y + 2 * r + g for y, r, g in coord.VALID_YRG ]
+ALL_CELLS_MASK = (1 << coord.NUM_CELLS) - 1
+G0_CELLS_MASK = sum( 1 << idx for idx, (y, r, g) in enumerate(coord.VALID_YRG) if g == 0 )
+
+# Placement table binary file format (little-endian):
+# - header: magic, version, crc32 of the PIECES & board definition, number of piece variants,
+#   crc32 of the rest of the file.
+# - per piece variant: key, angle, g_count[0], g_count[1], number of placements.
+# - per placement: anchor y_abs, r_abs, g, cells mask, adjacents mask.
+PLACEMENTS_MAGIC = b"TGPT"
+PLACEMENTS_VERSION = 2
+PLACEMENTS_HEADER = struct.Struct("<4sHIHI")
+PLACEMENTS_VARIANT = struct.Struct("<4sHBBH")
+PLACEMENTS_ENTRY = struct.Struct("<BBBQQ")
+
+# Binary solution store file format (little-endian), see SolutionsWriter and SolutionsReader:
+# - header: magic, version, crc32 of the piece names & signature letters, record size, pieces per solution.
+# - per solution: perm_index, then one uint16 per placed piece (piece name index << 10 | angle/60 << 7
+#   | y_abs << 4 | r_abs << 1 | g), then the signature packed with 3 bits per cell (SIGNATURE_LETTERS).
+SOLUTIONS_MAGIC = b"TGSB"
+SOLUTIONS_VERSION = 1
+SOLUTIONS_NUM_PIECES = 11
+SOLUTIONS_SIG_SIZE = (3 * coord.NUM_CELLS + 7) // 8
+SOLUTIONS_HEADER = struct.Struct("<4sHIHH")
+SOLUTIONS_RECORD = struct.Struct(f"<I{SOLUTIONS_NUM_PIECES}H{SOLUTIONS_SIG_SIZE}s")
+SOLUTIONS_DTYPE = np.dtype([
+    ("perm_index", "<u4"),
+    ("placed", "<u2", (SOLUTIONS_NUM_PIECES,)),
+    ("signature", "u1", (SOLUTIONS_SIG_SIZE,)),
+])
+# First letter of each cell color in Cells.signature(), E being EMPTY_CELL.
+SIGNATURE_LETTERS = "EBORWY"
+# Number of solutions sorted in memory by merge_solutions().
+MERGE_RUN_SIZE = 1000000
+
 PIECES = {
     "HR": {
         "color": "Red",
@@ -102,63 +181,93 @@ PIECES = {
     },
 }
 
+# Piece type (PIECES key) of each piece name.
+PIECE_TYPES = { name: key for key, properties in PIECES.items() for name in properties.get("name", [ key ]) }
+
+# All the piece names (including chiral variants), indexed in the binary solution store.
+SOLUTIONS_PIECE_NAMES = [ name for key, properties in PIECES.items() for name in properties.get("name", [ key ]) ]
+
 
 class Cells:
     def __init__(self):
         self.cells   = None     # list[Cell]
-        self.colors  = None     # list[str]
+        self._colors = None     # list[str]
+        self._pending = ()      # tuple of (mask, color) not yet painted into _colors
         self.placed  = None     # list[tuple(piece,y,r)]
         self.perm_index = 0
         self.g_free = [ coord.NUM_CELLS // 2, coord.NUM_CELLS // 2 ]
+        self.mask = 0           # bitboard of occupied cells, bit N is coord.VALID_YRG[N]
 
     def init_cells(self, yrg_coords:YRGCoord) -> "Cells":
         self.cells = []
-        self.colors = [ INVALID_CELL ] * (coord.N * coord.N * 2)
-        for triangle in self._triangles(yrg_coords):
+        self._colors = [ INVALID_CELL ] * (coord.N * coord.N * 2)
+        for triangle in yrg_coords.geometry().triangles:
             self.cells.append(Cell(triangle, None, (64, 64, 64)))
             y_abs, r_abs, g = triangle.yrg.to_abs()
             self.set_color(y_abs, r_abs, g, color=EMPTY_CELL)
         return self
 
+    @property
+    def colors(self) -> list:
+        """
+        The color of each cell, indexed by 2*N*y_abs + 2*r_abs + g.
+        Pieces placed with place_mask() are only painted when the colors are accessed.
+        """
+        if self._pending:
+            colors = self._colors.copy()
+            for mask, color in self._pending:
+                while mask:
+                    low = mask & -mask
+                    colors[BIT_TO_COLOR_IDX[low.bit_length() - 1]] = color
+                    mask ^= low
+            self._colors = colors
+            self._pending = ()
+        return self._colors
+
     def valid(self, y_abs, r_abs, g) -> bool:
-        idx = 12 * y_abs + 2 * r_abs + g
-        return idx >= 0 and idx < len(self.colors) and self.colors[idx] != INVALID_CELL
+        return (y_abs, r_abs, g) in coord.VALID_YRG_TO_IDX
 
     def occupied(self, y_abs, r_abs, g) -> bool:
-        idx = 12 * y_abs + 2 * r_abs + g
-        if idx >= 0 and idx < len(self.colors):
-            c = self.colors[idx]
-            return c != EMPTY_CELL and c != INVALID_CELL
-        else:
-            return False
+        idx = coord.VALID_YRG_TO_IDX.get( (y_abs, r_abs, g) )
+        return idx is not None and (self.mask >> idx) & 1 == 1
 
     def get_color(self, y_abs, r_abs, g):
-        idx = 12 * y_abs + 2 * r_abs + g
+        idx = 2 * coord.N * y_abs + 2 * r_abs + g
         return self.colors[idx]
 
     def set_color(self, y_abs, r_abs, g, color) -> None:
-        idx = 12 * y_abs + 2 * r_abs + g
-        old_color = self.colors[idx]
-        self.colors[idx] = color
+        idx = 2 * coord.N * y_abs + 2 * r_abs + g
+        colors = self.colors
+        old_color = colors[idx]
+        colors[idx] = color
         if old_color == EMPTY_CELL and old_color != color:
             assert self.g_free[g] > 0
             self.g_free[g] -= 1
+            self.mask |= 1 << coord.VALID_YRG_TO_IDX[ (y_abs, r_abs, g) ]
+
+    def place_mask(self, mask:int, g_count:list, color:str) -> "Cells":
+        """
+        Returns a new Cells with the given bitboard mask occupied by a piece of the given color.
+        Callers must have checked that the mask does not overlap the occupied cells.
+        """
+        new_cells = Cells()
+        new_cells.cells = self.cells    # Warning: linked, not duplicated!
+        new_cells._colors = self._colors    # Shared, only painted on access.
+        new_cells._pending = self._pending + ( (mask, color), )
+        new_cells.g_free = [ self.g_free[0] - g_count[0], self.g_free[1] - g_count[1] ]
+        new_cells.perm_index = self.perm_index
+        new_cells.mask = self.mask | mask
+        return new_cells
 
     def copy(self) -> "Cells":
         new_cells = Cells()
         new_cells.cells = self.cells    # Warning: linked, not duplicated!
-        new_cells.colors = self.colors.copy()
+        new_cells._colors = self.colors.copy()
         new_cells.g_free = self.g_free.copy()
         new_cells.perm_index = self.perm_index
+        new_cells.mask = self.mask
         return new_cells
 
-    def _triangles(self, yrg_coords:YRGCoord) -> TGenerator:
-        # TBD: merge dup in ImageProcessor
-        for (y, r, g) in coord.VALID_YRG:
-            y_piece = y - N2
-            r_piece = r - N2
-            yield yrg_coords.triangle(YRG(y_piece, r_piece, g))
-
     def signature(self) -> str:
         sig = "".join([ col[0] for col in self.colors if col != INVALID_CELL ])
         return sig
@@ -169,6 +278,413 @@ class Cells:
         return ",".join([ f"{piece_info['key']}@{piece_info['angle']}:{y_abs}x{r_abs}x{g}" for piece_info, y_abs, r_abs, g in self.placed ])
 
 
+class ExactCover:
+    """
+    Knuth's Algorithm X for the exact cover rows from Generator.exact_cover_rows().
+    The sparse matrix is kept as X (column -> set of rows covering it) and
+    Y (row -> list of its columns), and the search always branches on the most
+    constrained column, i.e. the one with the fewest rows left.
+    When root_column is set, the search branches on that column first instead.
+    """
+    def __init__(self, rows:list, copies:dict, root_column:int=None):
+        self.rows = rows
+        self.copies = copies
+        self.root_column = root_column
+        self.Y = []
+        for piece_column, rank, piece_info, y_abs, r_abs, g, mask in rows:
+            columns = [ idx for idx in range(coord.NUM_CELLS) if (mask >> idx) & 1 ]
+            columns.append(piece_column)
+            self.Y.append(columns)
+        self.X = { column: set() for column in range(coord.NUM_CELLS + len(copies)) }
+        for row, columns in enumerate(self.Y):
+            for column in columns:
+                self.X[column].add(row)
+        self.selected = []      # list[tuple(row, removed columns)]
+        self.chosen_rank = {}   # piece_column -> rank, only for identical pieces
+        self.node_count = 0
+        self.reject_count = 0
+        self.depth_nodes = [ 0 ] * (len(copies) + 1)
+
+    def in_order(self, row:int) -> bool:
+        """
+        Identical pieces must be placed in increasing rank order, otherwise the
+        same solution would be found once per permutation of these pieces.
+        """
+        piece_column, rank = self.rows[row][0:2]
+        for other in self.copies[piece_column]:
+            other_rank = self.chosen_rank.get(other)
+            if other_rank is not None:
+                if other < piece_column and other_rank > rank:
+                    return False
+                if other > piece_column and other_rank < rank:
+                    return False
+        return True
+
+    def select(self, row:int) -> bool:
+        """Adds the row to the partial solution. Returns false if the row is rejected."""
+        piece_column = self.rows[row][0]
+        if len(self.copies[piece_column]) > 1:
+            if not self.in_order(row):
+                return False
+            self.chosen_rank[piece_column] = self.rows[row][1]
+        X = self.X
+        Y = self.Y
+        removed = []
+        for j in Y[row]:
+            for i in X[j]:
+                for k in Y[i]:
+                    if k != j:
+                        X[k].remove(i)
+            removed.append(X.pop(j))
+        self.selected.append( (row, removed) )
+        return True
+
+    def deselect(self) -> None:
+        """Removes the last selected row from the partial solution."""
+        row, removed = self.selected.pop()
+        X = self.X
+        Y = self.Y
+        for j in reversed(Y[row]):
+            X[j] = removed.pop()
+            for i in X[j]:
+                for k in Y[i]:
+                    if k != j:
+                        X[k].add(i)
+        self.chosen_rank.pop(self.rows[row][0], None)
+
+    def choose_column(self) -> int:
+        X = self.X
+        if not self.selected and self.root_column is not None:
+            return self.root_column
+        return min(X, key=lambda c: len(X[c]))
+
+    def prefixes(self, depth:int) -> TGenerator:
+        """
+        Yields the lists of rows selected in the first depth levels of the search,
+        in the same order as solve(). Each one is an independent subtree of the search.
+        """
+        if depth == 0 or not self.X:
+            yield [ row for row, _ in self.selected ]
+            return
+        column = self.choose_column()
+        for row in sorted(self.X[column]):
+            if not self.select(row):
+                continue
+            yield from self.prefixes(depth - 1)
+            self.deselect()
+
+    def solve(self) -> TGenerator:
+        """Yields the list of selected rows of each solution reachable from the current state."""
+        if not self.X:
+            yield [ row for row, _ in self.selected ]
+            return
+        column = self.choose_column()
+        self.depth_nodes[len(self.selected)] += len(self.X[column])
+        for row in sorted(self.X[column]):
+            self.node_count += 1
+            if not self.select(row):
+                if __debug__: self.reject_count += 1
+                continue
+            yield from self.solve()
+            self.deselect()
+
+
+class CellCover:
+    """
+    Exact cover search for the rows from Generator.exact_cover_rows() that always
+    branches on the empty cell with the fewest placements left, across all the
+    remaining pieces. Identical pieces share a single set of rows with a count of
+    copies left, so that no ordering constraint is needed between them.
+
+    The number of live placements of each cell and piece is updated incrementally:
+    selecting a row kills every live row overlapping it (and the rows of its piece
+    once all its copies are placed), and deselecting revives them.
+    When root_column is set, the search branches on the rows of that piece first.
+    """
+    def __init__(self, rows:list, copies:dict, root_column:int=None):
+        self.rows = rows
+        self.root_column = root_column
+        self.row_cells = [ [ idx for idx in range(coord.NUM_CELLS) if (mask >> idx) & 1 ]
+                           for _, _, _, _, _, _, mask in rows ]
+        self.cell_rows = [ [] for _ in range(coord.NUM_CELLS) ]
+        self.piece_rows = {}
+        self.piece_left = {}
+        self.alive = bytearray(len(rows))
+        for row, (piece_column, *_) in enumerate(rows):
+            if copies[piece_column][0] != piece_column:
+                continue
+            self.alive[row] = 1
+            for idx in self.row_cells[row]:
+                self.cell_rows[idx].append(row)
+            self.piece_rows.setdefault(piece_column, []).append(row)
+            self.piece_left[piece_column] = len(copies[piece_column])
+        self.cell_count = [ len(rows) for rows in self.cell_rows ]
+        self.piece_count = { piece: len(rows) for piece, rows in self.piece_rows.items() }
+        self.occupied = 0
+        self.selected = []      # list[tuple(row, killed rows)]
+        self.node_count = 0
+        self.reject_count = 0
+        self.depth_nodes = [ 0 ] * (len(copies) + 1)
+
+    def kill(self, row:int, killed:list) -> None:
+        self.alive[row] = 0
+        for idx in self.row_cells[row]:
+            self.cell_count[idx] -= 1
+        self.piece_count[self.rows[row][0]] -= 1
+        killed.append(row)
+
+    def select(self, row:int) -> bool:
+        """Adds the row to the partial solution. Always accepted, for compatibility with ExactCover."""
+        alive = self.alive
+        piece_column = self.rows[row][0]
+        killed = []
+        for idx in self.row_cells[row]:
+            for other in self.cell_rows[idx]:
+                if alive[other]:
+                    self.kill(other, killed)
+        self.piece_left[piece_column] -= 1
+        if self.piece_left[piece_column] == 0:
+            for other in self.piece_rows[piece_column]:
+                if alive[other]:
+                    self.kill(other, killed)
+        self.occupied |= self.rows[row][6]
+        self.selected.append( (row, killed) )
+        return True
+
+    def deselect(self) -> None:
+        """Removes the last selected row from the partial solution."""
+        row, killed = self.selected.pop()
+        piece_column = self.rows[row][0]
+        for other in killed:
+            self.alive[other] = 1
+            for idx in self.row_cells[other]:
+                self.cell_count[idx] += 1
+            self.piece_count[self.rows[other][0]] += 1
+        self.piece_left[piece_column] += 1
+        self.occupied ^= self.rows[row][6]
+
+    def choose_cell(self) -> int:
+        """
+        Returns the empty cell with the fewest live placements, or -1 when the
+        partial solution is a dead end (a cell or a remaining piece can't be covered).
+        """
+        for piece, left in self.piece_left.items():
+            if left and self.piece_count[piece] < left:
+                return -1
+        best = -1
+        best_count = len(self.rows) + 1
+        cell_count = self.cell_count
+        occupied = self.occupied
+        for idx in range(coord.NUM_CELLS):
+            if not (occupied >> idx) & 1 and cell_count[idx] < best_count:
+                best = idx
+                best_count = cell_count[idx]
+                if best_count == 0:
+                    return -1
+        return best
+
+    def branches(self, idx:int) -> list:
+        alive = self.alive
+        return [ row for row in self.cell_rows[idx] if alive[row] ]
+
+    def choose_rows(self) -> list:
+        """Returns the live rows to branch on, or None when the partial solution is a dead end."""
+        if not self.selected and self.root_column is not None:
+            alive = self.alive
+            return [ row for row in self.piece_rows[self.root_column] if alive[row] ]
+        idx = self.choose_cell()
+        if idx < 0:
+            return None
+        return self.branches(idx)
+
+    def prefixes(self, depth:int) -> TGenerator:
+        """
+        Yields the lists of rows selected in the first depth levels of the search,
+        in the same order as solve(). Each one is an independent subtree of the search.
+        """
+        if depth == 0 or self.occupied == ALL_CELLS_MASK:
+            yield [ row for row, _ in self.selected ]
+            return
+        branch_rows = self.choose_rows()
+        if branch_rows is None:
+            return
+        for row in branch_rows:
+            self.select(row)
+            yield from self.prefixes(depth - 1)
+            self.deselect()
+
+    def solve(self) -> TGenerator:
+        """Yields the list of selected rows of each solution reachable from the current state."""
+        if self.occupied == ALL_CELLS_MASK:
+            yield [ row for row, _ in self.selected ]
+            return
+        branch_rows = self.choose_rows()
+        if branch_rows is None:
+            if __debug__: self.reject_count += 1
+            return
+        for row in branch_rows:
+            self.node_count += 1
+            self.depth_nodes[len(self.selected)] += 1
+            self.select(row)
+            yield from self.solve()
+            self.deselect()
+
+
+# Solvers for the exact cover model, by --gen-solver name.
+EXACT_COVER_SOLVERS = {
+    "dlx": ExactCover,
+    "cells": CellCover,
+}
+
+
+class SolutionsWriter:
+    """
+    Appends solutions to a binary solution store, see SOLUTIONS_RECORD.
+    The header is written when the file is empty, and validated otherwise.
+    """
+    def __init__(self, path:str):
+        self.path = path
+        if os.path.exists(path) and os.path.getsize(path) > 0:
+            with open(path, "rb") as f:
+                read_solutions_header(f, path)
+        self.file = open(path, "ab")
+        if self.file.tell() == 0:
+            self.file.write(SOLUTIONS_HEADER.pack(SOLUTIONS_MAGIC, SOLUTIONS_VERSION, solutions_crc(),
+                                                  SOLUTIONS_RECORD.size, SOLUTIONS_NUM_PIECES))
+
+    def write(self, perm_index:int, signature:str, placed:list) -> None:
+        """Appends one solution, with placed a list of (name, angle, y_abs, r_abs, g) tuples."""
+        self.file.write(SOLUTIONS_RECORD.pack(perm_index, *encode_placed(placed), encode_signature(signature)))
+
+    def write_cells(self, cells:Cells) -> None:
+        placed = [ (piece_info["key"], piece_info["angle"], y_abs, r_abs, g)
+                   for piece_info, y_abs, r_abs, g in cells.placed ]
+        self.write(cells.perm_index, cells.signature(), placed)
+
+    def tell(self) -> int:
+        return self.file.tell()
+
+    def flush(self) -> None:
+        self.file.flush()
+        os.fsync(self.file.fileno())
+
+    def close(self) -> None:
+        self.file.close()
+
+    def __enter__(self) -> "SolutionsWriter":
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+
+class SolutionsReader:
+    """
+    Memory-maps a binary solution store. The records are also available as a numpy
+    structured array in self.records, with the fields of SOLUTIONS_DTYPE.
+    """
+    def __init__(self, path:str):
+        self.path = path
+        with open(path, "rb") as f:
+            read_solutions_header(f, path)
+        size = os.path.getsize(path) - SOLUTIONS_HEADER.size
+        if size % SOLUTIONS_RECORD.size:
+            raise ValueError(f"Truncated solution store {path}")
+        if size == 0:
+            self.records = np.zeros(0, dtype=SOLUTIONS_DTYPE)
+        else:
+            self.records = np.memmap(path, dtype=SOLUTIONS_DTYPE, mode="r", offset=SOLUTIONS_HEADER.size)
+
+    def __len__(self) -> int:
+        return len(self.records)
+
+    def __getitem__(self, index:int) -> Tuple[int, str, list]:
+        """Returns the perm_index, the signature and the list of (name, angle, y_abs, r_abs, g) of one solution."""
+        record = self.records[index]
+        return (int(record["perm_index"]),
+                decode_signature(record["signature"].tobytes()),
+                decode_placed(record["placed"].tolist()))
+
+    def __iter__(self) -> TGenerator:
+        for index in range(len(self.records)):
+            yield self[index]
+
+
+def solutions_crc() -> int:
+    return zlib.crc32(repr( (SOLUTIONS_PIECE_NAMES, SIGNATURE_LETTERS) ).encode())
+
+def read_solutions_header(f, path:str) -> None:
+    header = f.read(SOLUTIONS_HEADER.size)
+    if len(header) != SOLUTIONS_HEADER.size:
+        raise ValueError(f"Invalid solution store {path}")
+    magic, version, crc, record_size, num_pieces = SOLUTIONS_HEADER.unpack(header)
+    if (magic != SOLUTIONS_MAGIC
+            or version != SOLUTIONS_VERSION
+            or crc != solutions_crc()
+            or record_size != SOLUTIONS_RECORD.size
+            or num_pieces != SOLUTIONS_NUM_PIECES):
+        raise ValueError(f"Incompatible solution store {path}")
+
+def encode_placed(placed:list) -> list:
+    return [ (SOLUTIONS_PIECE_NAMES.index(name) << 10) | ((angle // 60) << 7) | (y_abs << 4) | (r_abs << 1) | g
+             for name, angle, y_abs, r_abs, g in placed ]
+
+def decode_placed(values:list) -> list:
+    return [ (SOLUTIONS_PIECE_NAMES[v >> 10], ((v >> 7) & 7) * 60, (v >> 4) & 7, (v >> 1) & 7, v & 1)
+             for v in values ]
+
+def encode_signature(signature:str) -> bytes:
+    value = 0
+    for i, letter in enumerate(signature):
+        value |= SIGNATURE_LETTERS.index(letter) << (3 * i)
+    return value.to_bytes(SOLUTIONS_SIG_SIZE, "little")
+
+def decode_signature(data:bytes) -> str:
+    value = int.from_bytes(data, "little")
+    return "".join([ SIGNATURE_LETTERS[(value >> (3 * i)) & 7] for i in range(coord.NUM_CELLS) ])
+
+def read_solution_file(path:str) -> TGenerator:
+    """
+    Yields the (perm_index, signature, placed) of each solution of a binary solution store
+    (.bin), or of a text report from the generator with lines with a signature followed
+    by the placed pieces. Lines without the placed pieces (e.g. from --gen-mode sig) are skipped.
+    """
+    if path.endswith(".bin"):
+        yield from SolutionsReader(path)
+        return
+    re_line = re.compile(r"(?:\[([0-9]+)\] SIG )?([BEORWY]{%d}) ([B-Yi12]{2}@[0-9]+:[0-9]+x[0-9]+x[0-9]+(?:,[B-Yi12]{2}@[0-9]+:[0-9]+x[0-9]+x[0-9]+)*)" % coord.NUM_CELLS)
+    re_placed = re.compile(r"([B-Yi12]{2})@([0-9]+):([0-9]+)x([0-9]+)x([0-9]+)")
+    with open(path, "r") as f:
+        for line in f:
+            match = re_line.search(line)
+            if not match:
+                continue
+            placed = [ (name, int(angle), int(y_abs), int(r_abs), int(g))
+                       for name, angle, y_abs, r_abs, g in re_placed.findall(match.group(3)) ]
+            if len(placed) != SOLUTIONS_NUM_PIECES:
+                continue
+            yield int(match.group(1) or 0), match.group(2), placed
+
+def convert_solutions(text_path:str, bin_path:str) -> int:
+    """
+    Converts a text report from the generator into a binary solution store.
+    Returns the number of solutions.
+    """
+    count = 0
+    with SolutionsWriter(bin_path) as store:
+        for perm_index, signature, placed in read_solution_file(text_path):
+            store.write(perm_index, signature, placed)
+            count += 1
+    return count
+
+def canonical_placed(placed:list) -> list:
+    """
+    Sorts the placed pieces in the PIECES order, so that the same solution always has the
+    same placed list whatever the order of its identical pieces (e.g. the 2 TY).
+    """
+    return sorted(placed, key=lambda p: (SOLUTIONS_PIECE_NAMES.index(p[0]),) + tuple(p[1:]))
+
+
 class Generator:
     def __init__(self, output_dir_path:str):
         self.output_dir_path = output_dir_path
@@ -179,6 +695,16 @@ class Generator:
         self.rot_cache = {}
         self.pos_cache = {}
         self.adjacents_cache = {}
+        self.mask_cache = {}
+        self.remaining_cache = {}
+        self.variants_cache = {}
+        self.types_g_sums_cache = {}
+        self.memo = collections.OrderedDict()    # (occupied, types) => (tails, estimated bytes)
+        self.memo_size = GEN_MEMO_SIZE
+        self.memo_bytes = 0
+        self.memo_hits = 0
+        self.memo_misses = 0
+        self.adjacency_tables = None
         # Statistics
         self.report_file = None
         self.gen_count = 0
@@ -188,8 +714,46 @@ class Generator:
         self.reject_yrg_invalid = 0
         self.reject_occupied = 0
         self.reject_adjacents = 0
+        self.reject_dead_region = 0
+        self.sol_count = 0
+        self.report_count = 0
+        # Metrics: nodes visited per search depth (number of pieces placed), and the
+        # progress of the search in permutations or tasks, see metrics.GenMetrics.
+        self.depth_nodes = [ 0 ] * (SOLUTIONS_NUM_PIECES + 1)
+        self.progress_done = 0
+        self.progress_total = 0
+        # Output: "full" renders and logs every solution, "sig" only writes
+        # their signatures, "bin" writes them in a binary solution store and
+        # "count" only keeps the totals.
+        self.gen_mode = "full"
+        self.store = None
+        # Symmetry
+        self.symmetry = "full"
+        self.mirror_bits = None
+        self.mirror_placements = {}
+        # Checkpoints
+        self.solver = None
+        self.checkpoint_path = None
+        self.checkpoint_ts = 0
+        self.frontier = None
+        self.done_tasks = set()
 
-    def generate(self, gen_output_name:str, overwrite:bool, cores_num:int, core_index:int, perm_start:int) -> None:
+    def generate(self,
+                 gen_output_name:str,
+                 overwrite:bool,
+                 cores_num:int,
+                 core_index:int,
+                 perm_start:int,
+                 placements_name:str=None,
+                 solver:str="perm",
+                 jobs:int=1,
+                 resume:bool=False,
+                 symmetry:str="full",
+                 gen_mode:str="full",
+                 memo_size:int=GEN_MEMO_SIZE,
+                 metrics_name:str=None,
+                 metrics_interval:float=GEN_METRICS_INTERVAL,
+                 metrics_port:int=0) -> None:
         gen_output_name = gen_output_name.replace("IDX", str(core_index))
         gen_output_name = gen_output_name.replace("CORES", str(cores_num))
         report_file_path = os.path.join(self.output_dir_path, gen_output_name)
@@ -198,10 +762,51 @@ class Generator:
         print(f"File: {report_file_path}")
         print("------")
 
+        self.solver = solver
+        self.symmetry = symmetry
+        self.gen_mode = gen_mode
+        self.memo_size = memo_size
+        store_path = os.path.splitext(report_file_path)[0] + ".bin"
+        self.checkpoint_path = report_file_path + ".checkpoint"
+        self.checkpoint_ts = time.time()
+        kind = "perm" if solver == "perm" and jobs <= 1 else "tasks"
+        if resume:
+            if not self.resume_checkpoint(report_file_path, store_path, kind):
+                return
+            if kind == "perm":
+                perm_start = max(perm_start, self.frontier["perm"] + 1)
+
+        if gen_mode == "bin":
+            self.store = SolutionsWriter(store_path)
+            print(f"Solutions: {store_path}")
+        metrics = None
+        if metrics_name or metrics_port:
+            metrics_path = os.path.join(self.output_dir_path, metrics_name) if metrics_name else None
+            metrics = GenMetrics(self, metrics_path, metrics_interval, metrics_port)
+            metrics.start()
         with open(report_file_path, "a") as self.report_file:
             self.size_px, self.yrg_coords, cells_empty = self.create_cells(PX_CELL_SIZE)
-            self.precompute_positions(cells_empty)
-            for cells in self.gen_all_solutions(cells_empty, cores_num, core_index, perm_start):
+            placements_path = None
+            if placements_name:
+                placements_path = os.path.join(self.output_dir_path, placements_name)
+            self.precompute_positions(cells_empty, placements_path)
+            if jobs > 1:
+                solutions = self.gen_parallel(cells_empty, solver, jobs, cores_num, core_index, perm_start, placements_path)
+            elif solver in EXACT_COVER_SOLVERS:
+                solutions = self.gen_exact_cover(cells_empty)
+            else:
+                solutions = self.gen_all_solutions(cells_empty, cores_num, core_index, perm_start)
+            for cells in self.symmetric_solutions(cells_empty, solutions):
+                self.report_count += 1
+                if gen_mode == "count":
+                    continue
+                if gen_mode == "bin":
+                    self.store.write_cells(cells)
+                    continue
+                if gen_mode == "sig":
+                    # Buffered, checkpoints flush the report before recording its size.
+                    self.report_file.write(f"@@ [{cells.perm_index}] SIG {cells.signature()}\n")
+                    continue
                 img = self.draw_cells_into(cells, dest_img=None)
                 self.write_indexed_img(img)
                 r = f"@@ [{cells.perm_index}] SIG {cells.signature()} {cells.placed_str()}"
@@ -209,10 +814,19 @@ class Generator:
                 self.report_file.write(r)
                 self.report_file.write("\n")
                 self.report_file.flush()
+            if gen_mode == "count":
+                self.report_file.write(f"@@ COUNT solutions={self.report_count}\n")
+            if self.frontier is not None:
+                self.save_checkpoint(done=True)
+        if self.store is not None:
+            self.store.close()
+            self.store = None
+        if metrics is not None:
+            metrics.stop()
 
 
         print("")
-        print(f"Stats: permutations={self.perm_count}, gen calls={self.gen_count}, images={self.img_count}")
+        print(f"Stats: permutations={self.perm_count}, gen calls={self.gen_count}, solutions={self.report_count}, images={self.img_count}")
         print("")
 
     def create_cells(self, cell_size: int) -> Tuple[YRGCoord, Cells]:
@@ -243,12 +857,12 @@ class Generator:
         else:
             dest_img.fill(0)
 
-        radius = int(cells.cells[0].triangle.inscribed_circle_radius() *.5 )
+        # The cells of all the solutions share the geometry of self.yrg_coords.
+        geometry = self.yrg_coords.geometry()
+        cell_colors = [ cells.colors[color_idx] for color_idx in BIT_TO_COLOR_IDX ]
         bg = (32, 32, 32)
 
-        for cell in cells.cells:
-            poly = np.int32(cell.triangle.to_np_array())
-            color = cells.get_color(*cell.triangle.yrg.to_abs())
+        for poly, color in zip(geometry.cell_polygons, cell_colors):
             # color can be a tuple (b, g, r) or a color str
             if color == EMPTY_CELL:
                 fg = bg
@@ -260,9 +874,7 @@ class Generator:
             cv2.fillPoly(dest_img, [poly], fg)
             # This border will become transparent around every cell.
             cv2.polylines(dest_img, [poly], isClosed=True, color=(0, 0, 0), thickness=1)
-        for cell in cells.cells:
-            poly = np.int32(cell.triangle.to_np_array())
-            color = cells.get_color(*cell.triangle.yrg.to_abs())
+        for poly, color in zip(geometry.cell_polygons, cell_colors):
             if color != EMPTY_CELL:
                 # Redraw a darker but not transparent border around painted cells only.
                 cv2.polylines(dest_img, [poly], isClosed=True, color=(8, 8, 8), thickness=1)
@@ -291,55 +903,79 @@ class Generator:
         Returns a new cell list if the piece can fit.
         Otherwise returns None.
         """
-        color_name = piece_info["color"]
-
-        rotated, g_count = self.rotate_piece_cells(piece_cells, piece_info, angle_deg)
+        placement = self.piece_mask(piece_cells, piece_info, angle_deg, y_offset, r_offset)
+        if placement is None:
+            # Some YRG coordinates are out of bounds.
+            self.reject_yrg_invalid += 1
+            return None
+        mask, g_count, surround = placement
 
         if validate:
             # Validate that the puzzle has enought empty cells to event fit the piece
             # (we don't check whether they are adjacent here, just the global count)
-            # print("@@", piece_info["key"], color_name, "g_count", g_count, "cells", dest_cells.g_free, dest_cells.signature())
-            if g_count[0] > dest_cells.g_free[0] or g_count[1] > dest_cells.g_free[1]:
+            g_free = dest_cells.g_free
+            if g_count[0] > g_free[0] or g_count[1] > g_free[1]:
                 # The piece definitely will not fit here.
                 self.reject_g_count += 1
                 return None
 
-        # Make a "deep" copy of cells only when needed
-        copy_on_write = True
-        cells = dest_cells
-
-        for y, r, g in rotated:
-            y_abs = y + y_offset + N2
-            r_abs = r + r_offset + N2
-
-            if not cells.valid(y_abs, r_abs, g):
-                # The YRG coordinate is out of bounds.
-                if __debug__: self.reject_yrg_invalid += 1
-                return None
-            if cells.occupied(y_abs, r_abs, g):
-                # That cell is already occupied.
-                if __debug__: self.reject_occupied += 1
-                return None
-            if copy_on_write:
-                cells = cells.copy()
-                copy_on_write = False
-            cells.set_color(y_abs, r_abs, g, color_name)
+        if dest_cells.mask & mask:
+            # Some cells are already occupied.
+            self.reject_occupied += 1
+            return None
 
         if validate:
             # The piece fits at the desired location.
             # Now validate that we are not leaving 1-single empty cells around.
-            adjacents = self.adjacents_cells(rotated, piece_info, angle_deg)
-            for y, r, g in adjacents:
-                y_abs = y + y_offset + N2
-                r_abs = r + r_offset + N2
-                if not cells.occupied(y_abs, r_abs, g):
-                    if cells.valid(y_abs, r_abs, g):
-                        if self.is_cell_surrounded(y_abs, r_abs, g, cells):
-                            # Skip this permutation.
-                            if __debug__: self.reject_adjacents += 1
-                            return None
+            new_mask = dest_cells.mask | mask
+            for bit, around in surround:
+                if not new_mask & bit and new_mask & around == around:
+                    # Skip this permutation.
+                    self.reject_adjacents += 1
+                    return None
 
-        return cells
+        return dest_cells.place_mask(mask, g_count, piece_info["color"])
+
+    def piece_mask(self, piece_cells:list, piece_info:dict, angle_deg:int, y_offset:int, r_offset:int) -> Tuple:
+        """
+        Returns the bitboard placement of a piece rotated by angle_deg with its first cell
+        at the relative (y_offset, r_offset), or None if any cell falls outside the board.
+        The placement is a tuple (mask, g_count, surround) where surround lists the
+        (bit, around_mask) of each empty valid cell adjacent to the piece: that cell becomes
+        surrounded when all the bits of its around_mask are occupied.
+        """
+        positions = self.mask_cache.get( (piece_info["key"], angle_deg) )
+        if positions is None:
+            positions = {}
+            self.mask_cache[ (piece_info["key"], angle_deg) ] = positions
+        else:
+            try:
+                return positions[ (y_offset, r_offset) ]
+            except KeyError:
+                pass
+
+        rotated, g_count = self.rotate_piece_cells(piece_cells, piece_info, angle_deg)
+        placement = None
+        mask = 0
+        for y, r, g in rotated:
+            idx = coord.VALID_YRG_TO_IDX.get( (y + y_offset + N2, r + r_offset + N2, g) )
+            if idx is None:
+                break
+            mask |= 1 << idx
+        else:
+            surround = []
+            for y, r, g in self.adjacents_cells(rotated, piece_info, angle_deg):
+                idx = coord.VALID_YRG_TO_IDX.get( (y + y_offset + N2, r + r_offset + N2, g) )
+                if idx is not None:
+                    around = 0
+                    for adjacent in coord.VALID_YRG_ADJACENTS[idx].values():
+                        if adjacent:
+                            around |= 1 << coord.VALID_YRG_TO_IDX[adjacent]
+                    surround.append( (1 << idx, around) )
+            placement = (mask, g_count, tuple(surround))
+
+        positions[ (y_offset, r_offset) ] = placement
+        return placement
 
     def rotate_piece_cells(self, yrg_list:list, piece_info:dict, angle_deg:int) -> Tuple[list,list]:
         """
@@ -374,22 +1010,21 @@ class Generator:
         return result
 
     def adjacents_cells(self, yrg_list:list, piece_info:dict, angle_deg:int) -> list:
+        """
+        Returns the relative (y,r,g) cells adjacent to the given rotated piece cells.
+        These are not bound-checked as the piece is not placed on the board yet.
+        """
         cache_key = f"{piece_info['key']}@{angle_deg}"
         cached = self.adjacents_cache.get(cache_key)
         if cached is not None:
             return cached
 
-        abs_neigh = []
-        abs_list = [ (y + N2, r + N2, g) for y, r, g in yrg_list ]
-        for yrg_abs in abs_list:
-            idx = coord.VALID_YRG_TO_IDX[ yrg_abs ]
-            adjacents = coord.VALID_YRG_ADJACENTS[idx]
-            for adjacent in adjacents.values():
-                if (adjacent
-                    and not adjacent in abs_neigh
-                    and not adjacent in abs_list):
-                    abs_neigh.append(adjacent)
-        yrg_neigh = [ (y_abs - N2, r_abs - N2, g) for y_abs, r_abs, g in abs_neigh ]
+        yrg_neigh = []
+        for y, r, g in yrg_list:
+            for adjacent in coord.lattice_adjacents(y, r, g):
+                if (not adjacent in yrg_neigh
+                    and not adjacent in yrg_list):
+                    yrg_neigh.append(adjacent)
 
         self.adjacents_cache[cache_key] = yrg_neigh
         return yrg_neigh
@@ -397,22 +1032,20 @@ class Generator:
     def is_cell_surrounded(self, y_abs:int, r_abs:int, g:int, cells:Cells) -> bool:
         idx = coord.VALID_YRG_TO_IDX[ (y_abs, r_abs, g) ]
         adjacents = coord.VALID_YRG_ADJACENTS[idx]
-        num_occupied = 0
-        num_cells = 0
         for adjacent in adjacents.values():
             if adjacent:
-                num_cells += 1
-                y_abs, r_abs, g = adjacent
-                if cells.occupied(y_abs, r_abs, g):
-                    num_occupied += 1
-        return num_occupied == num_cells
+                if not (cells.mask >> coord.VALID_YRG_TO_IDX[adjacent]) & 1:
+                    return False
+        return True
 
-    def gen_pieces_list(self, select_piece:int=0) -> TGenerator:
+    def gen_pieces_list(self, select_piece:int=0, prefix:list=None, depth:int=None) -> TGenerator:
         """
         Generate all the combinations of pieces we want to place, and their
         rotation, but without indicating where to place them.
 
         select_piece: for debugging purposes, only keep the selected piece.
+        prefix: optional list of piece_info already chosen for the first pieces.
+        depth: optional number of pieces to generate, e.g. to only list prefixes.
         """
         pieces = []
         for key, properties in PIECES.items():
@@ -453,16 +1086,34 @@ class Generator:
                     _new_current.append( _info )
                     yield from _gen(_pieces, _new_current)
 
-        yield from _gen(pieces, [])
+        prefix = prefix or []
+        yield from _gen(pieces[len(prefix):depth], prefix)
 
-    def gen_all_solutions(self, cells_empty:Cells, cores_num:int, core_index:int, perm_start:int) -> TGenerator:
+    def count_permutations(self, start:int=0) -> int:
+        """Returns the number of permutations generated by gen_pieces_list() after its first start pieces."""
+        variants = []
+        for key, properties in PIECES.items():
+            for i in range(0, properties.get("count", 1)):
+                variants.append(len(properties["cells"]) * (properties.get("rot", 300) // 60 + 1))
+        return math.prod(variants[start:])
+
+    def gen_all_solutions(self,
+                          cells_empty:Cells,
+                          cores_num:int,
+                          core_index:int,
+                          perm_start:int,
+                          prefix:list=None,
+                          perm_offset:int=0) -> TGenerator:
         print("@@ Generate All Solutions")
         ts = time.time()
         spd = 0
-        perm_count = self.perm_count
-        for permutations in self.gen_pieces_list(DEBUG_PIECE):
+        perm_count = perm_offset
+        if prefix is None:
+            self.progress_total = self.count_permutations()
+        for permutations in self.gen_pieces_list(DEBUG_PIECE, prefix):
             perm_count += 1
             self.perm_count = perm_count
+            self.progress_done = perm_count - 1
             if cores_num > 1:
                 if perm_count % cores_num != core_index:
                     if __debug__: print(f"@@ skip {perm_count}    ")
@@ -471,31 +1122,607 @@ class Generator:
                 if __debug__: print(f"@@ skip {perm_count}    ")
                 continue
             perms_str = " ".join([ f"{x['key']}@{x['angle']}" for x in permutations ])
-            print(f"@@ perm {perm_count}, {'%.2f' % spd} s/p, img {self.img_count}, {self.gen_count} / {self.gen_failed} [ {self.reject_g_count} {self.reject_yrg_invalid} {self.reject_occupied} {self.reject_adjacents} ] -- {perms_str}")
+            print(f"@@ perm {perm_count}, {'%.2f' % spd} s/p, img {self.img_count}, {self.gen_count} / {self.gen_failed} [ {self.reject_g_count} {self.reject_yrg_invalid} {self.reject_occupied} {self.reject_adjacents} {self.reject_dead_region} ] -- {perms_str}")
             cells_empty.perm_index = perm_count
             yield from self.place_first_piece(cells_empty, permutations, [])
+            self.checkpoint({ "perm": perm_count })
+            self.progress_done = perm_count
             nts = time.time()
             if nts > ts:
                 spd = (nts - ts)
                 ts = nts
-        r = f"@@ DEBUG num permutations: piece={DEBUG_PIECE} perms_count={perm_count} gen_count={self.gen_failed} / {self.gen_count} img_count={self.img_count}"
+        r = f"@@ DEBUG num permutations: piece={DEBUG_PIECE} perms_count={perm_count} gen_count={self.gen_failed} / {self.gen_count} img_count={self.img_count} memo={self.memo_hits} / {self.memo_misses}"
         self.report_file.write(r)
         self.report_file.write("\n")
         print(r)
 
-    def precompute_positions(self, cells_empty:Cells) -> None:
+    def exact_cover_rows(self) -> Tuple[list, dict]:
+        """
+        Models the puzzle as an exact cover problem.
+        There is one column per board cell (0..NUM_CELLS-1) followed by one column per
+        physical piece. Each row is one placement of one chirality and rotation of a piece,
+        as a tuple (piece_column, rank, piece_info, y_abs, r_abs, g, mask).
+        Placements covering the same cells with the same piece are only listed once.
+
+        Identical pieces (e.g. the 2 TY) have one column each with the same placements,
+        and the rank orders these placements. Returns the rows and a dict of
+        piece_column: list of all the columns of identical pieces.
+        """
+        rows = []
+        copies = {}
+        column = coord.NUM_CELLS
+        for key, properties in PIECES.items():
+            count = properties.get("count", 1)
+            names = properties.get("name", [ key ])
+            columns = list(range(column, column + count))
+            for piece_column in columns:
+                copies[piece_column] = columns
+                visited = set()
+                rank = 0
+                for i, cells in enumerate(properties["cells"]):
+                    for angle in range(0, properties.get("rot", 300) + 1, 60):
+                        piece_info = {
+                            "key": names[i],
+                            "names": names,
+                            "cells": cells,
+                            "rot": properties.get("rot", 300),
+                            "color": properties["color"],
+                            "angle": angle,
+                        }
+                        _, all_pos = self.piece_positions(piece_info)
+                        for y_abs, r_abs, g, mask, _ in all_pos:
+                            if mask in visited:
+                                continue
+                            if self.symmetry != "full" and key == SYMMETRY_PIECE and mask > self.mirror_mask(mask):
+                                continue
+                            visited.add(mask)
+                            rows.append( (piece_column, rank, piece_info, y_abs, r_abs, g, mask) )
+                            rank += 1
+            column += count
+        return rows, copies
+
+    def exact_cover_solver(self, solver:str, rows:list, copies:dict):
+        """
+        Returns the EXACT_COVER_SOLVERS solver for the rows from exact_cover_rows().
+        With a symmetry reduction, the search branches on SYMMETRY_PIECE first: its rows
+        only keep half of its placements, so this halves the search tree.
+        """
+        root_column = None
+        if self.symmetry != "full":
+            root_column = next(piece_column for piece_column, _, piece_info, *_ in rows
+                               if PIECE_TYPES[piece_info["key"]] == SYMMETRY_PIECE)
+        return EXACT_COVER_SOLVERS[solver](rows, copies, root_column)
+
+    def gen_exact_cover(self, cells_empty:Cells) -> TGenerator:
+        """
+        Enumerates all the solutions in one pass by solving the exact cover model from
+        exact_cover_rows(). Yields one Cells per solution, with perm_index set to the
+        solution number.
+        """
+        print(f"@@ Generate All Solutions (exact cover, {self.solver})")
+        rows, copies = self.exact_cover_rows()
+        print(f"@@ Exact cover: {len(rows)} placements")
+        ts = time.time()
+        solver = self.exact_cover_solver(self.solver, rows, copies)
+        self.progress_total = sum(1 for _ in solver.prefixes(GEN_TASK_DLX_DEPTH))
+        # Solve one subtree at a time, as in gen_parallel(), so that checkpoints can
+        # record which subtrees are done.
+        for task_index, _ in enumerate(solver.prefixes(GEN_TASK_DLX_DEPTH)):
+            if task_index not in self.done_tasks:
+                for selected in solver.solve():
+                    self.sol_count += 1
+                    yield self.exact_cover_cells(cells_empty, rows, selected, self.sol_count)
+                self.done_tasks.add(task_index)
+            self.gen_count += solver.node_count
+            if __debug__: self.gen_failed += solver.reject_count
+            self.add_depth_nodes(solver.depth_nodes)
+            solver.node_count = solver.reject_count = 0
+            solver.depth_nodes = [ 0 ] * len(solver.depth_nodes)
+            self.progress_done = task_index + 1
+            self.checkpoint({ "tasks": self.done_tasks })
+
+        r = f"@@ DEBUG exact cover: solutions={self.sol_count} gen_count={self.gen_failed} / {self.gen_count} img_count={self.img_count} in {'%.2f' % (time.time() - ts)} s"
+        self.report_file.write(r)
+        self.report_file.write("\n")
+        print(r)
+
+    def add_depth_nodes(self, depth_nodes:list) -> None:
+        for depth, count in enumerate(depth_nodes):
+            self.depth_nodes[depth] += count
+
+    def exact_cover_cells(self, cells_empty:Cells, rows:list, selected:list, perm_index:int) -> Cells:
+        """Converts the rows selected by the exact cover solver into a Cells solution."""
+        cells = cells_empty
+        placed = []
+        for row in sorted(selected, key=lambda row: rows[row][0:2]):
+            _, _, piece_info, y_abs, r_abs, g, mask = rows[row]
+            g_count, _ = self.piece_positions(piece_info)
+            cells = cells.place_mask(mask, g_count, piece_info["color"])
+            placed.append( (piece_info, y_abs, r_abs, g) )
+        cells.placed = placed
+        cells.perm_index = perm_index
+        return cells
+
+    def gen_parallel(self,
+                     cells_empty:Cells,
+                     solver:str,
+                     jobs:int,
+                     cores_num:int,
+                     core_index:int,
+                     perm_start:int,
+                     placements_path:str=None) -> TGenerator:
+        """
+        Enumerates all the solutions using a pool of worker processes.
+        The search tree is split into independent subtrees (the permutations of the first
+        GEN_TASK_PERM_DEPTH pieces for the "perm" solver, or the first GEN_TASK_DLX_DEPTH
+        placements for the exact cover solvers). Subtrees are handed out one at a time so that
+        all the workers stay busy until the end, and the solutions are merged here.
+        """
+        print(f"@@ Generate All Solutions ({solver}, {jobs} jobs)")
+        ts = time.time()
+        if solver in EXACT_COVER_SOLVERS:
+            rows, copies = self.exact_cover_rows()
+            tasks = list(self.exact_cover_solver(solver, rows, copies).prefixes(GEN_TASK_DLX_DEPTH))
+        else:
+            tasks = [ [ (p["key"], p["angle"]) for p in prefix ]
+                      for prefix in self.gen_pieces_list(DEBUG_PIECE, depth=GEN_TASK_PERM_DEPTH) ]
+        print(f"@@ Parallel: {len(tasks)} tasks, {len(self.done_tasks)} already done")
+
+        task_count = len(self.done_tasks)
+        self.progress_total = len(tasks)
+        self.progress_done = task_count
+        todo = [ (task_index, task) for task_index, task in enumerate(tasks) if task_index not in self.done_tasks ]
+        initargs = (self.output_dir_path, placements_path, solver, self.symmetry, self.gen_mode, self.memo_size, cores_num, core_index, perm_start)
+        with multiprocessing.Pool(jobs, initializer=_init_gen_worker, initargs=initargs) as pool:
+            for task_index, solutions, stats in pool.imap_unordered(_run_gen_task, todo):
+                task_count += 1
+                self.gen_count += stats["gen_count"]
+                self.gen_failed += stats["gen_failed"]
+                self.perm_count = max(self.perm_count, stats["perm_count"])
+                self.reject_g_count += stats["reject_g_count"]
+                self.reject_yrg_invalid += stats["reject_yrg_invalid"]
+                self.reject_occupied += stats["reject_occupied"]
+                self.reject_adjacents += stats["reject_adjacents"]
+                self.reject_dead_region += stats["reject_dead_region"]
+                self.add_depth_nodes(stats["depth_nodes"])
+                # Solutions only counted by place_memo() in the worker.
+                self.sol_count += stats["report_count"]
+                self.report_count += stats["report_count"]
+                print(f"@@ task {task_count} / {len(tasks)}, solutions {self.sol_count + len(solutions)}, {'%.2f' % (time.time() - ts)} s")
+                for perm_index, placed in solutions:
+                    self.sol_count += 1
+                    yield self.placed_cells(cells_empty, placed, perm_index or self.sol_count)
+                self.done_tasks.add(task_index)
+                self.progress_done = task_count
+                self.checkpoint({ "tasks": self.done_tasks })
+
+        r = f"@@ DEBUG parallel: solver={solver} jobs={jobs} tasks={len(tasks)} solutions={self.sol_count} gen_count={self.gen_failed} / {self.gen_count} img_count={self.img_count} in {'%.2f' % (time.time() - ts)} s"
+        self.report_file.write(r)
+        self.report_file.write("\n")
+        print(r)
+
+    def merge_solutions(self, shard_paths:list, bin_path:str, run_size:int=MERGE_RUN_SIZE) -> dict:
+        """
+        Merges the solutions of several generator outputs (text reports or binary stores) into
+        a single binary solution store without duplicates, sorted by solution_key().
+        This is an external sort: runs of up to run_size solutions are sorted in memory and
+        written to temporary files next to bin_path, then the runs are k-way merged.
+        Returns the merge statistics.
+        """
+        stats = {
+            "shards": {},
+            "solutions": 0,
+            "unique": 0,
+            "duplicates": 0,
+            "runs": 0,
+        }
+        if self.yrg_coords is None:
+            self.size_px, self.yrg_coords, _ = self.create_cells(PX_CELL_SIZE)
+        with tempfile.TemporaryDirectory(dir=os.path.dirname(os.path.abspath(bin_path))) as tmp_dir:
+            run_paths = []
+            run = []
+
+            def _write_run():
+                run.sort()
+                run_path = os.path.join(tmp_dir, "run_%04d.txt" % len(run_paths))
+                with open(run_path, "w") as f:
+                    f.writelines(run)
+                run_paths.append(run_path)
+                run.clear()
+
+            for shard_path in shard_paths:
+                count = 0
+                for perm_index, signature, placed in read_solution_file(shard_path):
+                    placed_str = ",".join([ f"{name}@{angle}:{y_abs}x{r_abs}x{g}"
+                                            for name, angle, y_abs, r_abs, g in canonical_placed(placed) ])
+                    run.append(f"{self.solution_key(placed)} {placed_str} {signature} {perm_index}\n")
+                    count += 1
+                    if len(run) >= run_size:
+                        _write_run()
+                print(f"@@ Read {count} solutions from {shard_path}")
+                stats["shards"][shard_path] = count
+                stats["solutions"] += count
+            if run:
+                _write_run()
+            stats["runs"] = len(run_paths)
+
+            re_placed = re.compile(r"([B-Yi12]{2})@([0-9]+):([0-9]+)x([0-9]+)x([0-9]+)")
+            with contextlib.ExitStack() as stack, SolutionsWriter(bin_path) as store:
+                runs = [ stack.enter_context(open(run_path, "r")) for run_path in run_paths ]
+                last = None
+                for line in heapq.merge(*runs):
+                    key, placed_str, signature, perm_index = line.split()
+                    if key == last:
+                        stats["duplicates"] += 1
+                        continue
+                    last = key
+                    placed = [ (name, int(angle), int(y_abs), int(r_abs), int(g))
+                               for name, angle, y_abs, r_abs, g in re_placed.findall(placed_str) ]
+                    store.write(int(perm_index), signature, placed)
+                    stats["unique"] += 1
+        return stats
+
+    def solution_key(self, placed:list) -> str:
+        """
+        Returns a key identifying a solution given as a list of (name, angle, y_abs, r_abs, g):
+        the sorted names and cell masks of its pieces. Unlike the placed list, it does not
+        depend on the order of identical pieces, on the anchor cell, or on the angle of
+        pieces with a rotational symmetry.
+        """
+        keys = []
+        for name, angle, y_abs, r_abs, g in placed:
+            piece_info = self.find_piece_info(name, angle)
+            mask, _, _ = self.piece_mask(piece_info["cells"], piece_info, angle, y_abs - N2, r_abs - N2)
+            keys.append(f"{name}:{mask:014x}")
+        keys.sort()
+        return ",".join(keys)
+
+    def find_piece_info(self, name:str, angle:int) -> dict:
+        """Returns the piece_info for the given piece name (e.g. "i1") and rotation angle."""
+        for key, properties in PIECES.items():
+            names = properties.get("name", [ key ])
+            if name in names:
+                return {
+                    "key": name,
+                    "names": names,
+                    "cells": properties["cells"][names.index(name)],
+                    "rot": properties.get("rot", 300),
+                    "color": properties["color"],
+                    "angle": angle,
+                }
+        raise KeyError(f"Unknown piece {name}")
+
+    def placed_cells(self, cells_empty:Cells, placed:list, perm_index:int) -> Cells:
+        """
+        Rebuilds a solution from a list of (name, angle, y_abs, r_abs, g) tuples,
+        as returned by the worker processes.
+        """
+        cells = cells_empty
+        new_placed = []
+        for name, angle, y_abs, r_abs, g in placed:
+            piece_info = self.find_piece_info(name, angle)
+            mask, g_count, _ = self.piece_mask(piece_info["cells"], piece_info, angle, y_abs - N2, r_abs - N2)
+            cells = cells.place_mask(mask, g_count, piece_info["color"])
+            new_placed.append( (piece_info, y_abs, r_abs, g) )
+        cells.placed = new_placed
+        cells.perm_index = perm_index
+        return cells
+
+    def mirror_mask(self, mask:int) -> int:
+        """Returns the bitboard mask mirrored along the vertical axis (see coord.MIRROR_V_SRC)."""
+        if self.mirror_bits is None:
+            self.mirror_bits = [ coord.VALID_YRG_TO_IDX[yrg] for yrg in coord.MIRROR_V_SRC ]
+        mirror = 0
+        while mask:
+            low = mask & -mask
+            mirror |= 1 << self.mirror_bits[low.bit_length() - 1]
+            mask ^= low
+        return mirror
+
+    def mirror_placement(self, piece_info:dict, mask:int) -> Tuple[int, Tuple]:
+        """
+        Returns the (name, angle, y_abs, r_abs, g) placement of the piece, or its other
+        chirality, that covers the mirror image of mask, with its rank in exact_cover_rows().
+        When several rotations cover the same cells, this picks the same one as exact_cover_rows().
+        """
+        names = tuple(piece_info["names"])
+        placements = self.mirror_placements.get(names)
+        if placements is None:
+            placements = {}
+            for name in names:
+                for angle in range(0, piece_info["rot"] + 1, 60):
+                    _, all_pos = self.piece_positions(self.find_piece_info(name, angle))
+                    for y_abs, r_abs, g, pos_mask, _ in all_pos:
+                        if pos_mask not in placements:
+                            placements[pos_mask] = (len(placements), (name, angle, y_abs, r_abs, g))
+            self.mirror_placements[names] = placements
+        return placements[self.mirror_mask(mask)]
+
+    def symmetric_solutions(self, cells_empty:Cells, solutions:TGenerator) -> TGenerator:
+        """
+        Expands or canonicalizes the solutions found with the symmetry piece restricted
+        to half of its placements.
+        With "expand", yields each solution and its mirror image.
+        With "canonical", yields only one solution of each mirror pair, the one with the
+        smallest signature and placements.
+        When the symmetry piece is its own mirror image, both solutions of the pair are
+        found by the search, so they are not expanded again.
+        """
+        if self.symmetry == "full":
+            yield from solutions
+            return
+        for cells in solutions:
+            mirror_placed = []
+            self_mirror = False
+            first_index = {}
+            for index, (piece_info, y_abs, r_abs, g) in enumerate(cells.placed):
+                mask, _, _ = self.piece_mask(piece_info["cells"], piece_info, piece_info["angle"], y_abs - N2, r_abs - N2)
+                rank, placement = self.mirror_placement(piece_info, mask)
+                # Identical pieces (e.g. the 2 TY) are listed by rank, as in gen_exact_cover().
+                index = first_index.setdefault(tuple(piece_info["names"]), index)
+                mirror_placed.append( (index, rank, placement) )
+                if piece_info["key"] == SYMMETRY_PIECE:
+                    self_mirror = mask == self.mirror_mask(mask)
+            mirror_placed = [ placement for _, _, placement in sorted(mirror_placed) ]
+            mirror = self.placed_cells(cells_empty, mirror_placed, cells.perm_index)
+            if self.symmetry == "expand":
+                yield cells
+                if not self_mirror:
+                    yield mirror
+            else:
+                key = (cells.signature(), cells.placed_str())
+                mirror_key = (mirror.signature(), mirror.placed_str())
+                if self_mirror:
+                    if key <= mirror_key:
+                        yield cells
+                else:
+                    yield cells if key <= mirror_key else mirror
+
+    def checkpoint(self, frontier:dict) -> None:
+        """
+        Records the search frontier, i.e. everything before it has been reported,
+        and saves a checkpoint every CHECKPOINT_SECONDS.
+        """
+        if not self.checkpoint_path:
+            return
+        self.frontier = frontier
+        if time.time() - self.checkpoint_ts >= CHECKPOINT_SECONDS:
+            self.save_checkpoint()
+
+    def save_checkpoint(self, done:bool=False) -> None:
+        """
+        Atomically writes the search frontier and the counters in the checkpoint file.
+        The report is flushed first and its size is recorded, so that a resumed run can
+        drop any solution reported after the frontier.
+        """
+        self.report_file.flush()
+        os.fsync(self.report_file.fileno())
+        if self.store is not None:
+            self.store.flush()
+        frontier = self.frontier.copy()
+        if "tasks" in frontier:
+            frontier["tasks"] = sorted(frontier["tasks"])
+        checkpoint = {
+            "version": CHECKPOINT_VERSION,
+            "crc": self.placements_crc(),
+            "solver": self.solver,
+            "symmetry": self.symmetry,
+            "done": done,
+            "report_size": self.report_file.tell(),
+            "store_size": self.store.tell() if self.store is not None else None,
+            "frontier": frontier,
+            "counters": { name: getattr(self, name) for name in CHECKPOINT_COUNTERS },
+        }
+        tmp_path = self.checkpoint_path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(checkpoint, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.checkpoint_path)
+        self.checkpoint_ts = time.time()
+        if __debug__: print(f"@@ Saved checkpoint {self.checkpoint_path}")
+
+    def resume_checkpoint(self, report_file_path:str, store_path:str, kind:str) -> bool:
+        """
+        Restores the frontier and the counters from the checkpoint file, and truncates
+        the report and the solution store to their size at the time of the checkpoint.
+        Returns false if the generation cannot or does not need to resume.
+        """
+        try:
+            with open(self.checkpoint_path, "r") as f:
+                checkpoint = json.load(f)
+        except FileNotFoundError:
+            print(f"Error: no checkpoint to resume from at {self.checkpoint_path}")
+            return False
+        if (checkpoint.get("version") != CHECKPOINT_VERSION
+                or checkpoint.get("crc") != self.placements_crc()
+                or checkpoint.get("solver") != self.solver
+                or checkpoint.get("symmetry") != self.symmetry
+                or (checkpoint.get("store_size") is not None) != (self.gen_mode == "bin")
+                or kind not in checkpoint.get("frontier", {})):
+            print(f"Error: checkpoint {self.checkpoint_path} does not match the current generator options")
+            return False
+        if checkpoint["done"]:
+            print(f"Generation already completed in {report_file_path}")
+            return False
+        report_size = checkpoint["report_size"]
+        if not os.path.exists(report_file_path) or os.path.getsize(report_file_path) < report_size:
+            print(f"Error: report {report_file_path} is shorter than its checkpoint")
+            return False
+        store_size = checkpoint["store_size"]
+        if store_size is not None and (not os.path.exists(store_path) or os.path.getsize(store_path) < store_size):
+            print(f"Error: solution store {store_path} is shorter than its checkpoint")
+            return False
+        with open(report_file_path, "r+") as f:
+            f.truncate(report_size)
+        if store_size is not None:
+            with open(store_path, "r+b") as f:
+                f.truncate(store_size)
+
+        for name in CHECKPOINT_COUNTERS:
+            setattr(self, name, checkpoint["counters"][name])
+        self.frontier = checkpoint["frontier"]
+        self.done_tasks = set(self.frontier.get("tasks", []))
+        print(f"@@ Resuming from checkpoint {self.checkpoint_path}: {self.frontier if kind == 'perm' else str(len(self.done_tasks)) + ' tasks'} done, {self.sol_count} solutions")
+        return True
+
+    def precompute_positions(self, cells_empty:Cells, placements_path:str=None) -> None:
+        """
+        Computes the placement table: all the positions of each piece variant on the board.
+        When placements_path is given, the table is loaded from that file if it is valid,
+        otherwise it is computed and saved in that file.
+        """
+        if placements_path and self.load_placements(placements_path):
+            return
         print("@@ Precompute Cached Positions")
         for select_piece in range(0, len(PIECES)):
             for permutations in self.gen_pieces_list(select_piece):
                 assert len(permutations) == 1
-                p = permutations[0]
-                pos_key = f"{p['key']}@{p['angle']}"
-                all_pos = []
-                for new_cells in self.place_first_piece(cells_empty, permutations, []):
-                    if new_cells is not None:
-                        piece_info, y_abs, r_abs, g = new_cells.placed[0]
-                        all_pos.append( (y_abs, r_abs, g) )
-                self.pos_cache[pos_key] = all_pos
+                self.piece_positions(permutations[0], cells_empty)
+        if placements_path:
+            self.save_placements(placements_path)
+
+    def piece_positions(self, piece_info:dict, cells_empty:Cells=None) -> Tuple[list, list]:
+        """
+        Returns the g_count of a piece variant and all the positions where it fits on an
+        empty board, as a list of (y_abs, r_abs, g, mask, surround) tuples.
+        See piece_mask() for mask and surround.
+        """
+        key = piece_info["key"]
+        angle_deg = piece_info["angle"]
+        pos_key = f"{key}@{angle_deg}"
+        cached = self.pos_cache.get(pos_key)
+        if cached is not None:
+            return cached
+
+        piece_cells = piece_info["cells"]
+        # g value of the first cell once rotated
+        rotated, g_count = self.rotate_piece_cells(piece_cells, piece_info, angle_deg)
+        first_g = rotated[0][2]
+        empty_mask = 0 if cells_empty is None else cells_empty.mask
+
+        all_pos = []
+        # Iterate over all the board, only starting on cells with the same g value
+        for y_abs, r_abs, g in coord.VALID_YRG:
+            if g != first_g:
+                continue
+            placement = self.piece_mask(piece_cells, piece_info, angle_deg, y_abs - N2, r_abs - N2)
+            if placement is None:
+                continue
+            mask, _, surround = placement
+            new_mask = empty_mask | mask
+            if any(not new_mask & bit and new_mask & around == around for bit, around in surround):
+                # This piece would always leave a single empty cell on the board.
+                continue
+            all_pos.append( (y_abs, r_abs, g, mask, surround) )
+
+        result = (g_count, all_pos)
+        self.pos_cache[pos_key] = result
+        return result
+
+    def placements_crc(self) -> int:
+        """Identifies the pieces & board definitions used to compute a placement table."""
+        return zlib.crc32(repr( (PIECES, coord.VALID_YRG) ).encode("ascii"))
+
+    def save_placements(self, placements_path:str) -> None:
+        data = []
+        for pos_key, (g_count, all_pos) in self.pos_cache.items():
+            key, angle = pos_key.split("@")
+            data.append(PLACEMENTS_VARIANT.pack(key.encode("ascii"), int(angle), g_count[0], g_count[1], len(all_pos)))
+            for y_abs, r_abs, g, mask, surround in all_pos:
+                adjacents = 0
+                for bit, _ in surround:
+                    adjacents |= bit
+                data.append(PLACEMENTS_ENTRY.pack(y_abs, r_abs, g, mask, adjacents))
+        payload = b"".join(data)
+        header = PLACEMENTS_HEADER.pack(PLACEMENTS_MAGIC,
+                                        PLACEMENTS_VERSION,
+                                        self.placements_crc(),
+                                        len(self.pos_cache),
+                                        zlib.crc32(payload))
+        # The --gen-cores processes all start by saving the same table: each one writes its
+        # own temporary file, and the last one replaces the others.
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(placements_path)),
+                                        prefix=os.path.basename(placements_path) + ".",
+                                        suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(header)
+                f.write(payload)
+            os.replace(tmp_path, placements_path)
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+        print(f"@@ Saved placements table {placements_path}")
+
+    def load_placements(self, placements_path:str) -> bool:
+        """
+        Loads the placement table saved by save_placements().
+        Returns false if the file does not exist, does not match the current pieces or is
+        corrupted, in which case the table must be computed again.
+        """
+        if not os.path.exists(placements_path):
+            return False
+        with open(placements_path, "rb") as f:
+            data = f.read()
+        if len(data) < PLACEMENTS_HEADER.size:
+            print(f"@@ Ignoring invalid placements table {placements_path}")
+            return False
+        magic, version, crc, num_variants, payload_crc = PLACEMENTS_HEADER.unpack_from(data, 0)
+        if magic != PLACEMENTS_MAGIC or version != PLACEMENTS_VERSION or crc != self.placements_crc():
+            print(f"@@ Ignoring outdated placements table {placements_path}")
+            return False
+        if zlib.crc32(data[PLACEMENTS_HEADER.size:]) != payload_crc:
+            print(f"@@ Ignoring invalid placements table {placements_path}")
+            return False
+        try:
+            pos_cache = self.unpack_placements(data, num_variants)
+        except struct.error:
+            pos_cache = None
+        if pos_cache is None:
+            print(f"@@ Ignoring invalid placements table {placements_path}")
+            return False
+        self.pos_cache = pos_cache
+        print(f"@@ Loaded placements table {placements_path}")
+        return True
+
+    def unpack_placements(self, data:bytes, num_variants:int) -> dict:
+        """
+        Returns the pos_cache of a placement table file, or None if its size does not match
+        its content. Raises struct.error if it is truncated.
+        """
+        # Mask of the valid neighbors of each cell, to recompute the surround pairs.
+        around = []
+        for adjacents in coord.VALID_YRG_ADJACENTS:
+            mask = 0
+            for adjacent in adjacents.values():
+                if adjacent:
+                    mask |= 1 << coord.VALID_YRG_TO_IDX[adjacent]
+            around.append(mask)
+
+        pos_cache = {}
+        offset = PLACEMENTS_HEADER.size
+        for _ in range(num_variants):
+            key, angle, g0, g1, num_pos = PLACEMENTS_VARIANT.unpack_from(data, offset)
+            offset += PLACEMENTS_VARIANT.size
+            if offset + num_pos * PLACEMENTS_ENTRY.size > len(data):
+                return None
+            all_pos = []
+            for y_abs, r_abs, g, mask, adjacents in PLACEMENTS_ENTRY.iter_unpack(
+                    data[offset : offset + num_pos * PLACEMENTS_ENTRY.size]):
+                surround = []
+                while adjacents:
+                    bit = adjacents & -adjacents
+                    surround.append( (bit, around[bit.bit_length() - 1]) )
+                    adjacents ^= bit
+                all_pos.append( (y_abs, r_abs, g, mask, tuple(surround)) )
+            offset += num_pos * PLACEMENTS_ENTRY.size
+            key = key.rstrip(b"\0").decode("ascii")
+            pos_key = f"{key}@{angle}"
+            pos_cache[pos_key] = ( [g0, g1], all_pos )
+        if offset != len(data):
+            return None
+        return pos_cache
 
     def place_single_piece(self, cells:Cells, piece_info:dict, y_abs, r_abs, g) -> Cells:
         key = piece_info["key"]
@@ -505,51 +1732,380 @@ class Generator:
 
         return self._place_piece(cells, piece_cells, piece_info, y_abs - N2, r_abs - N2, angle_deg, validate=False)
 
-    def place_first_piece(self, cells:Cells, combos:list, placed:list) -> TGenerator:
+    def remaining_pieces(self, combos:list) -> list:
+        """
+        For each piece in combos, returns a tuple (g_sums, suffix, types) describing the pieces after it:
+        - g_sums are all the (g0, g1) cell counts that can be covered by a subset of these pieces.
+          Their rotation is known so each one covers a fixed number of g=0 and g=1 cells,
+          e.g. TO@0 covers 2 g=0 and 1 g=1 cells, and TO@60 the opposite.
+        - suffix is the tuple of their (key, angle), and types the tuple of their piece types,
+          see memo_tails().
+        """
+        key = tuple( (piece_info["key"], piece_info["angle"]) for piece_info in combos )
+        remaining = self.remaining_cache.get(key)
+        if remaining is None:
+            remaining = []
+            g_sums = frozenset([ (0, 0) ])
+            for index in range(len(combos) - 1, -1, -1):
+                types = tuple( PIECE_TYPES[name] for name, _ in key[index + 1:] )
+                remaining.append( (g_sums, key[index + 1:], types) )
+                g_count, _ = self.piece_positions(combos[index])
+                g_sums = g_sums | { (g0 + g_count[0], g1 + g_count[1]) for g0, g1 in g_sums }
+            remaining.reverse()
+            self.remaining_cache[key] = remaining
+        return remaining
+
+    def is_dead_region(self, empty:int, mask:int, g_sums:frozenset) -> bool:
+        """
+        Checks whether placing a piece at mask split the empty cells into regions that
+        cannot be filled: flood-fills the regions around the piece, and returns true if
+        any has a (g0, g1) cell count that no subset of the remaining pieces covers.
+        The flood stops as soon as it reaches all the empty cells around the piece, as
+        the piece then did not split the region it was placed in.
+        """
+        t0, t1, t2, t3 = self.adjacent_tables()
+        ring = (t0[mask & 0xFFFF] | t1[(mask >> 16) & 0xFFFF]
+                | t2[(mask >> 32) & 0xFFFF] | t3[mask >> 48]) & empty
+        while ring:
+            region = frontier = ring & -ring
+            while frontier:
+                if ring & region == ring:
+                    # All the remaining cells around the piece are connected.
+                    return False
+                # Cells adjacent to the frontier, looked up 16 bits at a time.
+                frontier = (t0[frontier & 0xFFFF] | t1[(frontier >> 16) & 0xFFFF]
+                            | t2[(frontier >> 32) & 0xFFFF] | t3[frontier >> 48]) & empty & ~region
+                region |= frontier
+            ring &= ~region
+            g0 = (region & G0_CELLS_MASK).bit_count()
+            if (g0, region.bit_count() - g0) not in g_sums:
+                return True
+        return False
+
+    def adjacent_tables(self) -> list:
+        """
+        Returns 4 tables of 65536 bitboards: table[i][bits] is the mask of all the cells
+        adjacent to the cells of bits 16*i..16*i+15 set in bits.
+        """
+        if self.adjacency_tables is None:
+            adjacent_masks = []
+            for adjacents in coord.VALID_YRG_ADJACENTS:
+                around = 0
+                for adjacent in adjacents.values():
+                    if adjacent:
+                        around |= 1 << coord.VALID_YRG_TO_IDX[adjacent]
+                adjacent_masks.append(around)
+            tables = []
+            for i in range(0, (coord.NUM_CELLS + 15) // 16):
+                table = [ 0 ] * 65536
+                for bits in range(1, 65536):
+                    low = bits & -bits
+                    idx = 16 * i + low.bit_length() - 1
+                    table[bits] = table[bits ^ low] | (adjacent_masks[idx] if idx < coord.NUM_CELLS else 0)
+                tables.append(table)
+            self.adjacency_tables = tables
+        return self.adjacency_tables
+
+    def place_first_piece(self, cells:Cells, combos:list, placed:list, remaining:list=None) -> TGenerator:
         if len(combos) == 0:
             assert len(combos) > 0
             return # exit the generator without a result
+        if remaining is None:
+            remaining = self.remaining_pieces(combos)
+        g_sums, suffix, types = remaining[0]
+        remaining = remaining[1:]
         combos = combos.copy()
         piece_info = combos.pop(0)
-        key = piece_info["key"]
-        piece_cells = piece_info["cells"]
-        angle_deg = piece_info["angle"]
-        pos_key = f"{key}@{angle_deg}"
+        g_count, all_pos = self.piece_positions(piece_info)
+        color = piece_info["color"]
 
-        # g value of the first cell
-        first_g = piece_cells[0][2]
+        # Validate that the puzzle has enought empty cells to event fit the piece
+        # (we don't check whether they are adjacent here, just the global count)
+        if g_count[0] > cells.g_free[0] or g_count[1] > cells.g_free[1]:
+            # The piece definitely will not fit anywhere.
+            self.reject_g_count += 1
+            return
 
-        def _place_at(y_abs, r_abs, g):
-            new_cells = self._place_piece(cells, piece_cells, piece_info, y_abs - N2, r_abs - N2, angle_deg)
-            if __debug__: self.gen_count += 1
-            if new_cells is None:
-                # We were not able to place the piece on the board.
+        verbose = self.gen_mode == "full"
+        memoize = self.memo_size > 0 and len(combos) <= GEN_MEMO_PIECES
+        occupied = cells.mask
+        # Counted once per call rather than per position, so that the metrics are also
+        # available with python -O. The positions on occupied cells are the ones that did
+        # not fit, counted when all the positions have been tried.
+        self.gen_count += len(all_pos)
+        self.depth_nodes[len(placed)] += len(all_pos)
+        fits = 0
+        for y_abs, r_abs, g, mask, surround in all_pos:
+            if occupied & mask:
+                # That cell is already occupied.
                 # Loop and try next position.
                 if __debug__: self.gen_failed += 1
+                continue
+            fits += 1
+            # The piece fits at the desired location.
+            # Now validate that we are not leaving 1-single empty cells around.
+            new_mask = occupied | mask
+            for bit, around in surround:
+                if not new_mask & bit and new_mask & around == around:
+                    break
             else:
+                if combos and self.is_dead_region(ALL_CELLS_MASK ^ new_mask, mask, g_sums):
+                    # The empty cells are split in a region that the remaining pieces cannot fill.
+                    self.reject_dead_region += 1
+                    if __debug__: self.gen_failed += 1
+                    continue
+                new_cells = cells.place_mask(mask, g_count, color)
                 # Remember which piece was placed and where
                 new_placed = placed.copy()
                 new_placed.append( (piece_info, y_abs, r_abs, g) )
                 if len(combos) == 0:
-                    print(f"@@ GEN {self.gen_count} / {self.gen_failed} [ {self.reject_g_count} {self.reject_yrg_invalid} {self.reject_occupied} {self.reject_adjacents} ] -- img:{self.img_count}, g {new_cells.g_free[0]} {new_cells.g_free[1]}, sig {new_cells.signature()}")
+                    if verbose: print(f"@@ GEN {self.gen_count} / {self.gen_failed} [ {self.reject_g_count} {self.reject_yrg_invalid} {self.reject_occupied} {self.reject_adjacents} ] -- img:{self.img_count}, g {new_cells.g_free[0]} {new_cells.g_free[1]}, sig {new_cells.signature()}")
                     new_cells.placed = new_placed
                     yield new_cells
                 else:
-                    if __debug__: # Extra verbose, only for debugging
+                    if __debug__ and verbose: # Extra verbose, only for debugging
                         print(f"@@ SUB {self.gen_count} / {self.gen_failed} [ {self.reject_g_count} {self.reject_yrg_invalid} {self.reject_occupied} {self.reject_adjacents} ] -- img:{self.img_count}, g {new_cells.g_free[0]} {new_cells.g_free[1]}, sig {new_cells.signature()}", end="\r")
-                    yield from self.place_first_piece(new_cells, combos, new_placed)
+                    if memoize:
+                        yield from self.place_memo(new_cells, new_placed, suffix, types)
+                    else:
+                        yield from self.place_first_piece(new_cells, combos, new_placed, remaining)
+                continue
+            # Skip this position, it leaves a single empty cell.
+            self.reject_adjacents += 1
+            if __debug__: self.gen_failed += 1
+        self.reject_occupied += len(all_pos) - fits
+
+    def type_variants(self, piece_type:str) -> list:
+        """Returns the piece_info of each chirality and rotation of a piece, in the gen_pieces_list() order."""
+        variants = self.variants_cache.get(piece_type)
+        if variants is None:
+            properties = PIECES[piece_type]
+            variants = [ self.find_piece_info(name, angle)
+                         for name in properties.get("name", [ piece_type ])
+                         for angle in range(0, properties.get("rot", 300) + 1, 60) ]
+            self.variants_cache[piece_type] = variants
+        return variants
+
+    def types_g_sums(self, types:tuple) -> frozenset:
+        """Same as remaining_pieces() g_sums, for pieces of the given types in any rotation."""
+        g_sums = self.types_g_sums_cache.get(types)
+        if g_sums is None:
+            g_sums = frozenset([ (0, 0) ])
+            for piece_type in types:
+                g_counts = { tuple(self.piece_positions(piece_info)[0]) for piece_info in self.type_variants(piece_type) }
+                g_sums = g_sums | { (g0 + c0, g1 + c1) for g0, g1 in g_sums for c0, c1 in g_counts }
+            self.types_g_sums_cache[types] = g_sums
+        return g_sums
+
+    def memo_tails(self, occupied:int, types:tuple) -> dict:
+        """
+        Returns all the ways to fill the empty cells with one piece of each of the given types
+        (in this order) in any chirality and rotation, as a dict of the pieces (key, angle)
+        suffix: list of tuples of (piece_info, y_abs, r_abs, g, mask, g_count) placements.
+        Each list is in the same order as the solutions of place_first_piece() for that suffix.
+        When memo_counts(), the dict only holds the number of solutions of each suffix.
+
+        This is the transposition table of the "perm" solver: the permutations that only differ
+        in the rotation of their last pieces all reach the same boards, so the search below
+        these boards is done once for all the rotations and the results are stored with the
+        (occupied mask, piece types) key. The table keeps the most recently used entries within
+        memo_size MB, as estimated by memo_entry_bytes().
+        """
+        key = (occupied, types)
+        entry = self.memo.get(key)
+        if entry is not None:
+            self.memo_hits += 1
+            self.memo.move_to_end(key)
+            return entry[0]
+        self.memo_misses += 1
+        tails = self.fill_tails(occupied, types, {}, self.memo_counts())
+        size = self.memo_entry_bytes(tails)
+        max_bytes = self.memo_size << 20
+        if size <= max_bytes:
+            self.memo[key] = (tails, size)
+            self.memo_bytes += size
+            while self.memo_bytes > max_bytes:
+                _, (_, evicted_size) = self.memo.popitem(last=False)
+                self.memo_bytes -= evicted_size
+        return tails
+
+    def memo_counts(self) -> bool:
+        """
+        Returns True when memo_tails() only needs to count the solutions: with --gen-mode count,
+        unless symmetric_solutions() needs their placements to expand or canonicalize them.
+        """
+        return self.gen_mode == "count" and self.symmetry == "full"
+
+    def memo_entry_bytes(self, tails:dict) -> int:
+        """
+        Estimates the memory used by one memo_tails() entry: its dict, suffixes, lists and
+        tail tuples. The placement tuples are shared by the tails that start the same way, and
+        the piece_info dicts by all the entries, so they are not counted.
+        """
+        size = sys.getsizeof(tails)
+        for suffix, suffix_tails in tails.items():
+            size += sys.getsizeof(suffix)
+            if isinstance(suffix_tails, list):
+                size += sys.getsizeof(suffix_tails) + sum(map(sys.getsizeof, suffix_tails))
+        return size
 
-        all_pos = self.pos_cache.get(pos_key)
-        if all_pos is not None:
-            # If we have precomputed all posible cell locations for this piece
-            for y_abs, r_abs, g in all_pos:
-                yield from _place_at(y_abs, r_abs, g)
+    def fill_tails(self, occupied:int, types:tuple, boards:dict, count:bool=False) -> dict:
+        """
+        Computes memo_tails(), or the number of solutions of each suffix when count is set.
+        The boards reached below are only kept in the boards dict while filling one entry:
+        most of them are dead ends that would quickly evict the entries of the table, which
+        hold all the results anyway. The dict is cleared when it reaches GEN_MEMO_BOARDS.
+        """
+        key = (occupied, types)
+        tails = boards.get(key)
+        if tails is not None:
+            return tails
+        tails = {}
+        if not types:
+            if occupied == ALL_CELLS_MASK:
+                tails[()] = 1 if count else [ () ]
         else:
-            # Otherwise iterate over all the board, including possible invalid locations
-            for y_abs, r_abs, g in coord.VALID_YRG:
-                # Only starts on cells with the same g value
-                if g == first_g:
-                    yield from _place_at(y_abs, r_abs, g)
+            empty = ALL_CELLS_MASK ^ occupied
+            g_free = ( (empty & G0_CELLS_MASK).bit_count(), (empty & ~G0_CELLS_MASK).bit_count() )
+            g_sums = self.types_g_sums(types[1:])
+            for piece_info in self.type_variants(types[0]):
+                g_count, all_pos = self.piece_positions(piece_info)
+                if g_count[0] > g_free[0] or g_count[1] > g_free[1]:
+                    continue
+                variant = (piece_info["key"], piece_info["angle"])
+                self.gen_count += len(all_pos)
+                self.depth_nodes[SOLUTIONS_NUM_PIECES - len(types)] += len(all_pos)
+                for y_abs, r_abs, g, mask, surround in all_pos:
+                    if occupied & mask:
+                        continue
+                    new_mask = occupied | mask
+                    for bit, around in surround:
+                        if not new_mask & bit and new_mask & around == around:
+                            break
+                    else:
+                        if len(types) > 1 and self.is_dead_region(ALL_CELLS_MASK ^ new_mask, mask, g_sums):
+                            continue
+                        sub_tails = self.fill_tails(new_mask, types[1:], boards, count)
+                        if count:
+                            for suffix, sub_count in sub_tails.items():
+                                suffix = (variant,) + suffix
+                                tails[suffix] = tails.get(suffix, 0) + sub_count
+                            continue
+                        placement = (piece_info, y_abs, r_abs, g, mask, g_count)
+                        for suffix, suffix_tails in sub_tails.items():
+                            tails.setdefault( (variant,) + suffix, [] ).extend(
+                                [ (placement,) + tail for tail in suffix_tails ])
+        # Most boards are dead ends, they all share the same empty dict.
+        tails = tails or MEMO_DEAD_END
+        if len(boards) >= GEN_MEMO_BOARDS:
+            boards.clear()
+        boards[key] = tails
+        return tails
+
+    def place_memo(self, cells:Cells, placed:list, suffix:tuple, types:tuple) -> TGenerator:
+        """
+        Same as place_first_piece() for the pieces of the given suffix, using memo_tails().
+        When memo_counts(), nothing is yielded: the solutions are directly added to
+        report_count, which is all that --gen-mode count outputs.
+        """
+        tails = self.memo_tails(cells.mask, types)
+        if self.memo_counts():
+            self.report_count += tails.get(suffix, 0)
+            return
+        for tail in tails.get(suffix, ()):
+            new_cells = cells
+            for piece_info, y_abs, r_abs, g, mask, g_count in tail:
+                new_cells = new_cells.place_mask(mask, g_count, piece_info["color"])
+            new_cells.placed = placed + [ placement[:4] for placement in tail ]
+            yield new_cells
+
+
+# Worker process state for Generator.gen_parallel(), set by _init_gen_worker().
+_gen_worker = {}
+
+def _init_gen_worker(output_dir_path:str,
+                     placements_path:str,
+                     solver:str,
+                     symmetry:str,
+                     gen_mode:str,
+                     memo_size:int,
+                     cores_num:int,
+                     core_index:int,
+                     perm_start:int) -> None:
+    g = Generator(output_dir_path)
+    g.symmetry = symmetry
+    g.gen_mode = gen_mode
+    g.memo_size = memo_size
+    # The worker logs would interleave on the parent stdout, and are not kept either.
+    devnull = open(os.devnull, "w")
+    g.report_file = devnull
+    with contextlib.redirect_stdout(devnull):
+        g.size_px, g.yrg_coords, cells_empty = g.create_cells(PX_CELL_SIZE)
+        g.precompute_positions(cells_empty, placements_path)
+    _gen_worker["devnull"] = devnull
+    _gen_worker["generator"] = g
+    _gen_worker["cells_empty"] = cells_empty
+    _gen_worker["solver"] = solver
+    _gen_worker["cores"] = (cores_num, core_index, perm_start)
+    if solver in EXACT_COVER_SOLVERS:
+        rows, copies = g.exact_cover_rows()
+        _gen_worker["rows"] = rows
+        _gen_worker["exact_cover"] = g.exact_cover_solver(solver, rows, copies)
+
+def _run_gen_task(task:Tuple[int, list]) -> Tuple[list, dict]:
+    """
+    Enumerates all the solutions of one subtree in a worker process.
+    Returns the task index, a list of (perm_index, placed) solutions and the generator statistics.
+    The perm_index is 0 for the exact cover solvers, where solutions are numbered by the caller.
+    """
+    task_index, prefix = task
+    g = _gen_worker["generator"]
+    cells_empty = _gen_worker["cells_empty"]
+    g.gen_count = g.gen_failed = g.reject_g_count = g.reject_yrg_invalid = g.reject_occupied = g.reject_adjacents = g.reject_dead_region = 0
+    g.report_count = 0
+    g.depth_nodes = [ 0 ] * len(g.depth_nodes)
+    solutions = []
+    if _gen_worker["solver"] in EXACT_COVER_SOLVERS:
+        rows = _gen_worker["rows"]
+        solver = _gen_worker["exact_cover"]
+        solver.node_count = solver.reject_count = 0
+        solver.depth_nodes = [ 0 ] * len(solver.depth_nodes)
+        for row in prefix:
+            solver.select(row)
+        for selected in solver.solve():
+            cells = g.exact_cover_cells(cells_empty, rows, selected, 0)
+            solutions.append( (0, cells) )
+        for _ in prefix:
+            solver.deselect()
+        g.gen_count = solver.node_count
+        g.gen_failed = solver.reject_count
+        g.depth_nodes = solver.depth_nodes
+    else:
+        cores_num, core_index, perm_start = _gen_worker["cores"]
+        prefix = [ g.find_piece_info(name, angle) for name, angle in prefix ]
+        perm_offset = task_index * g.count_permutations(len(prefix))
+        # As in _init_gen_worker(), the per-permutation logs are discarded.
+        with contextlib.redirect_stdout(_gen_worker["devnull"]):
+            for cells in g.gen_all_solutions(cells_empty, cores_num, core_index, perm_start, prefix, perm_offset):
+                solutions.append( (cells.perm_index, cells) )
+
+    placed = []
+    for perm_index, cells in solutions:
+        placed.append( (perm_index, [ (piece_info["key"], piece_info["angle"], y_abs, r_abs, g)
+                                      for piece_info, y_abs, r_abs, g in cells.placed ]) )
+    stats = {
+        "gen_count": g.gen_count,
+        "gen_failed": g.gen_failed,
+        "perm_count": g.perm_count,
+        "reject_g_count": g.reject_g_count,
+        "reject_yrg_invalid": g.reject_yrg_invalid,
+        "reject_occupied": g.reject_occupied,
+        "reject_adjacents": g.reject_adjacents,
+        "reject_dead_region": g.reject_dead_region,
+        "report_count": g.report_count,
+        "depth_nodes": g.depth_nodes,
+    }
+    return task_index, placed, stats
 
 
 # ~~
@@ -0,0 +1,306 @@
+# Tangram Puzzle Image Analyzer
+#
+# (c) 2025 ralfoide at gmail
+
+import contextlib
+import io
+import json
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+import coord
+import gen
+from gen import Generator, PX_CELL_SIZE
+
+# A known solution. FixedGenerator restricts the first pieces of it to keep the searches short.
+SOLUTION = "HR@0:2x0x0,i2@0:4x1x1,W2@180:1x2x1,P2@300:1x0x0,VB@180:4x5x1,J2@180:2x2x1,L1@300:1x3x1,TW@0:0x2x0,TO@180:5x3x1,TY@60:4x4x1,TY@120:2x4x0"
+
+def parse_placed(placed_str:str) -> list:
+    """Parses a placed string such as SOLUTION into a list of (name, angle, y_abs, r_abs, g)."""
+    placed = []
+    for p in placed_str.split(","):
+        name, pos = p.split("@")
+        angle, pos = pos.split(":")
+        y_abs, r_abs, g = pos.split("x")
+        placed.append( (name, int(angle), int(y_abs), int(r_abs), int(g)) )
+    return placed
+
+
+class Interrupted(Exception):
+    pass
+
+
+class FixedGenerator(Generator):
+    """
+    A generator whose exact cover model only keeps 2 placements for the first pieces of
+    SOLUTION: their placement in SOLUTION and its mirror image. The restricted problem
+    is still symmetric, and has a few dozen solutions found in about a second.
+    The generation is interrupted before the solution numbered interrupt_at, if set.
+    """
+    fixed = 4
+
+    def __init__(self, output_dir_path:str):
+        super().__init__(output_dir_path)
+        self.interrupt_at = None
+
+    def exact_cover_rows(self) -> tuple:
+        rows, copies = super().exact_cover_rows()
+        _, _, cells_empty = self.create_cells(PX_CELL_SIZE)
+        for name, angle, y_abs, r_abs, g in parse_placed(SOLUTION)[:self.fixed]:
+            mask = self.placed_cells(cells_empty, [ (name, angle, y_abs, r_abs, g) ], 0).mask
+            allowed = { mask, self.mirror_mask(mask) }
+            key = gen.PIECE_TYPES[name]
+            rows = [ row for row in rows if gen.PIECE_TYPES[row[2]["key"]] != key or row[6] in allowed ]
+        return rows, copies
+
+    def gen_exact_cover(self, cells_empty:gen.Cells):
+        for cells in super().gen_exact_cover(cells_empty):
+            if cells.perm_index == self.interrupt_at:
+                raise Interrupted()
+            yield cells
+
+
+class GeneratorTest(unittest.TestCase):
+    def setUp(self):
+        self.output_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.output_dir)
+
+    def generate(self, name:str, interrupt_at:int=None, **kwargs) -> list:
+        """Runs a FixedGenerator and returns the lines of its report, without the timings."""
+        g = FixedGenerator(self.output_dir)
+        g.interrupt_at = interrupt_at
+        with contextlib.redirect_stdout(io.StringIO()):
+            g.generate(name, True, 1, 0, 0, **kwargs)
+        with open(os.path.join(self.output_dir, name), "r") as f:
+            return [ line for line in f if not line.startswith("@@ DEBUG") ]
+
+    def test_resume_exact_cover(self):
+        expected = self.generate("full.txt", solver="cells", gen_mode="sig")
+        self.assertGreater(len(expected), 10)
+
+        path = os.path.join(self.output_dir, "resumed.txt")
+        # Save a checkpoint after each task.
+        with mock.patch.object(gen, "CHECKPOINT_SECONDS", 0):
+            with self.assertRaises(Interrupted):
+                self.generate("resumed.txt", interrupt_at=len(expected) // 2, solver="cells", gen_mode="sig")
+        with open(path + ".checkpoint", "r") as f:
+            checkpoint = json.load(f)
+        self.assertFalse(checkpoint["done"])
+        self.assertGreater(len(checkpoint["frontier"]["tasks"]), 0)
+        # A partial line written after the checkpoint, which the resumed run must drop.
+        with open(path, "a") as f:
+            f.write("@@ [0] SIG ")
+        self.assertGreater(os.path.getsize(path), checkpoint["report_size"])
+
+        resumed = self.generate("resumed.txt", solver="cells", gen_mode="sig", resume=True)
+        self.assertEqual(resumed, expected)
+        with open(path + ".checkpoint", "r") as f:
+            self.assertTrue(json.load(f)["done"])
+
+    def solutions(self, name:str, **kwargs) -> list:
+        """Runs a FixedGenerator and returns the sorted solution keys and signatures of its store."""
+        self.generate(name + ".txt", gen_mode="bin", **kwargs)
+        g = Generator(self.output_dir)
+        g.size_px, g.yrg_coords, _ = g.create_cells(PX_CELL_SIZE)
+        return sorted([ (g.solution_key(placed), signature)
+                        for _, signature, placed in gen.SolutionsReader(os.path.join(self.output_dir, name + ".bin")) ])
+
+    def test_symmetry_expand(self):
+        for solver in gen.EXACT_COVER_SOLVERS:
+            with self.subTest(solver=solver):
+                full = self.solutions(f"full_{solver}", solver=solver, symmetry="full")
+                self.assertGreater(len(full), 10)
+                self.assertEqual(self.solutions(f"expand_{solver}", solver=solver, symmetry="expand"), full)
+
+    def test_merge_solutions(self):
+        self.generate("all.txt", solver="cells", gen_mode="bin")
+        solutions = list(gen.SolutionsReader(os.path.join(self.output_dir, "all.bin")))
+        self.assertGreater(len(solutions), 10)
+        third = len(solutions) // 3
+
+        # A text report with the first 2/3 of the solutions, with their 2 TY pieces swapped.
+        text_path = os.path.join(self.output_dir, "shard_0.txt")
+        with open(text_path, "w") as f:
+            f.write("@@ Generate All Solutions (exact cover, cells)\n")
+            for perm_index, signature, placed in solutions[:2 * third]:
+                ty = [ index for index, p in enumerate(placed) if p[0] == "TY" ]
+                self.assertEqual(len(ty), 2)
+                placed[ty[0]], placed[ty[1]] = placed[ty[1]], placed[ty[0]]
+                placed_str = ",".join([ f"{name}@{angle}:{y_abs}x{r_abs}x{g}" for name, angle, y_abs, r_abs, g in placed ])
+                f.write(f"@@ [{perm_index}] SIG {signature} {placed_str}\n")
+        # A binary store with the last 2/3 of the solutions, in reverse order.
+        bin_path = os.path.join(self.output_dir, "shard_1.bin")
+        with gen.SolutionsWriter(bin_path) as store:
+            for perm_index, signature, placed in reversed(solutions[third:]):
+                store.write(perm_index, signature, placed)
+
+        g = Generator(self.output_dir)
+        merged_path = os.path.join(self.output_dir, "merged.bin")
+        run_size = 5
+        with contextlib.redirect_stdout(io.StringIO()):
+            stats = g.merge_solutions([ text_path, bin_path ], merged_path, run_size=run_size)
+        total = 2 * third + len(solutions) - third
+        self.assertEqual(stats["shards"], { text_path: 2 * third, bin_path: len(solutions) - third })
+        self.assertEqual(stats["solutions"], total)
+        self.assertEqual(stats["unique"], len(solutions))
+        self.assertEqual(stats["duplicates"], third)
+        self.assertEqual(stats["runs"], (total + run_size - 1) // run_size)
+
+        merged = list(gen.SolutionsReader(merged_path))
+        keys = [ g.solution_key(placed) for _, _, placed in merged ]
+        self.assertEqual(keys, sorted(set([ g.solution_key(placed) for _, _, placed in solutions ])))
+        for _, _, placed in merged:
+            self.assertEqual(placed, gen.canonical_placed(placed))
+        self.assertEqual(sorted([ (perm_index, signature) for perm_index, signature, _ in merged ]),
+                         sorted([ (perm_index, signature) for perm_index, signature, _ in solutions ]))
+
+
+class PlacementsTableTest(unittest.TestCase):
+    def setUp(self):
+        self.output_dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.output_dir, "placements.bin")
+
+    def tearDown(self):
+        shutil.rmtree(self.output_dir)
+
+    def load(self) -> Generator:
+        """Returns a generator with the placement table of self.path, rebuilt if it is not valid."""
+        g = Generator(self.output_dir)
+        with contextlib.redirect_stdout(io.StringIO()):
+            g.size_px, g.yrg_coords, cells_empty = g.create_cells(PX_CELL_SIZE)
+            g.precompute_positions(cells_empty, self.path)
+        return g
+
+    def test_round_trip(self):
+        expected = self.load().pos_cache
+        self.assertEqual(os.listdir(self.output_dir), [ "placements.bin" ])
+        g = Generator(self.output_dir)
+        with contextlib.redirect_stdout(io.StringIO()):
+            self.assertTrue(g.load_placements(self.path))
+        # The loaded surround pairs are in bit order.
+        for pos_key, (g_count, all_pos) in expected.items():
+            self.assertEqual(g.pos_cache[pos_key], ( g_count, [ (y_abs, r_abs, g, mask, tuple(sorted(surround)))
+                                                               for y_abs, r_abs, g, mask, surround in all_pos ] ))
+        self.assertEqual(g.pos_cache.keys(), expected.keys())
+
+    def test_invalid(self):
+        expected = self.load().pos_cache
+        with open(self.path, "rb") as f:
+            data = f.read()
+        corrupted = bytearray(data)
+        corrupted[-1] ^= 0xFF
+        invalid = {
+            "payload": bytes(corrupted),
+            "truncated": data[:-gen.PLACEMENTS_ENTRY.size],
+            "header": data[:gen.PLACEMENTS_HEADER.size - 1],
+            "trailing": data + bytes(gen.PLACEMENTS_ENTRY.size),
+        }
+        for name, content in invalid.items():
+            with self.subTest(name=name):
+                with open(self.path, "wb") as f:
+                    f.write(content)
+                g = Generator(self.output_dir)
+                with contextlib.redirect_stdout(io.StringIO()):
+                    self.assertFalse(g.load_placements(self.path))
+                # The generator rebuilds the table and saves it again.
+                self.assertEqual(self.load().pos_cache, expected)
+                with open(self.path, "rb") as f:
+                    self.assertEqual(f.read(), data)
+
+    def test_truncated_variants(self):
+        # A valid payload crc, but fewer variants and placements than the header says.
+        self.load()
+        with open(self.path, "rb") as f:
+            data = f.read()
+        magic, version, crc, num_variants, _ = gen.PLACEMENTS_HEADER.unpack_from(data, 0)
+        payload = data[gen.PLACEMENTS_HEADER.size:-gen.PLACEMENTS_ENTRY.size]
+        with open(self.path, "wb") as f:
+            f.write(gen.PLACEMENTS_HEADER.pack(magic, version, crc, num_variants, gen.zlib.crc32(payload)))
+            f.write(payload)
+        g = Generator(self.output_dir)
+        with contextlib.redirect_stdout(io.StringIO()):
+            self.assertFalse(g.load_placements(self.path))
+        payload = data[gen.PLACEMENTS_HEADER.size:gen.PLACEMENTS_HEADER.size + gen.PLACEMENTS_VARIANT.size - 1]
+        with open(self.path, "wb") as f:
+            f.write(gen.PLACEMENTS_HEADER.pack(magic, version, crc, num_variants, gen.zlib.crc32(payload)))
+            f.write(payload)
+        with contextlib.redirect_stdout(io.StringIO()):
+            self.assertFalse(g.load_placements(self.path))
+
+
+class SolutionsStoreTest(unittest.TestCase):
+    def setUp(self):
+        self.output_dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.output_dir, "solutions.bin")
+        letters = gen.SIGNATURE_LETTERS
+        self.solutions = [
+            (12, "".join([ letters[i % len(letters)] for i in range(coord.NUM_CELLS) ]), parse_placed(SOLUTION)),
+            (34, "".join([ letters[-1 - i % len(letters)] for i in range(coord.NUM_CELLS) ]), parse_placed(SOLUTION)[::-1]),
+        ]
+
+    def tearDown(self):
+        shutil.rmtree(self.output_dir)
+
+    def write_solutions(self) -> None:
+        with gen.SolutionsWriter(self.path) as store:
+            for perm_index, signature, placed in self.solutions:
+                store.write(perm_index, signature, placed)
+
+    def test_round_trip(self):
+        self.write_solutions()
+        reader = gen.SolutionsReader(self.path)
+        self.assertEqual(len(reader), len(self.solutions))
+        self.assertEqual(list(reader), self.solutions)
+        self.assertEqual(list(gen.read_solution_file(self.path)), self.solutions)
+        # Appending validates the existing header and keeps the previous records.
+        self.write_solutions()
+        self.assertEqual(list(gen.SolutionsReader(self.path)), self.solutions * 2)
+
+    def corrupt(self, offset:int) -> None:
+        with open(self.path, "r+b") as f:
+            f.seek(offset)
+            value = f.read(1)
+            f.seek(offset)
+            f.write(bytes([ value[0] ^ 0xFF ]))
+
+    def test_bad_magic(self):
+        self.write_solutions()
+        self.corrupt(0)
+        with self.assertRaisesRegex(ValueError, "Incompatible"):
+            gen.SolutionsReader(self.path)
+        with self.assertRaisesRegex(ValueError, "Incompatible"):
+            gen.SolutionsWriter(self.path)
+
+    def test_bad_crc(self):
+        self.write_solutions()
+        self.corrupt(6)
+        with self.assertRaisesRegex(ValueError, "Incompatible"):
+            gen.SolutionsReader(self.path)
+
+    def test_other_signature_letters(self):
+        # The CRC covers the piece names and the signature letters.
+        with mock.patch.object(gen, "SIGNATURE_LETTERS", gen.SIGNATURE_LETTERS[::-1]):
+            self.write_solutions()
+        with self.assertRaisesRegex(ValueError, "Incompatible"):
+            gen.SolutionsReader(self.path)
+
+    def test_truncated(self):
+        self.write_solutions()
+        with open(self.path, "r+b") as f:
+            f.truncate(gen.SOLUTIONS_HEADER.size + gen.SOLUTIONS_RECORD.size + 1)
+        with self.assertRaisesRegex(ValueError, "Truncated"):
+            gen.SolutionsReader(self.path)
+        with open(self.path, "r+b") as f:
+            f.truncate(gen.SOLUTIONS_HEADER.size - 1)
+        with self.assertRaisesRegex(ValueError, "Invalid"):
+            gen.SolutionsReader(self.path)
+
+
+if __name__ == "__main__":
+    unittest.main()
+
+# ~~
@@ -3,20 +3,66 @@
 # (c) 2025 ralfoide at gmail
 
 import colors
+import concurrent.futures
+import contextlib
 import coord
 import cv2
+import hashlib
+import io
+import json
 import math
 import numpy as np
 import os
+import struct
+import sys
+import time
+import traceback
+import zlib
 
 from coord import Axis, YRG, YRGCoord, Triangle, segments, segment_center, VALID_YRG
-from typing import Generator
+from typing import Callable, Generator
 from typing import Tuple
 
 TAU = 2 * math.pi
 SHRINK_RATIO = 0.5
 RESIZE_PX = 1024
 
+# Colors of the cells, as classified by ImageProcessor.classify_cells().
+CELL_COLORS = [ "White", "Black", "Orange", "Yellow", "Red" ]
+
+# JPEG images can be decoded at 1/2, 1/4 or 1/8 of their size directly from the DCT
+# coefficients, which is several times faster and smaller than a full decode of large
+# photos. See load_resized_image().
+# The reduced image must still be decode_margin times larger than RESIZE_PX (--decode-margin,
+# 0 to always decode the full image): closer to RESIZE_PX, the final resize does not smooth
+# out the differences with a full decode, which can flip the colors of cells at a near tie.
+# The default of 2 was only checked on upscaled copies of the sample photo. It decodes
+# 12 MP photos (4032x3024) in full: a margin of 1.4 or less decodes them at 1/2.
+REDUCED_DECODE_FLAGS = [
+    (8, cv2.IMREAD_REDUCED_COLOR_8),
+    (4, cv2.IMREAD_REDUCED_COLOR_4),
+    (2, cv2.IMREAD_REDUCED_COLOR_2),
+]
+REDUCED_DECODE_MARGIN = 2
+
+# Analysis cache of the output dir, see AnalyzerCache.
+# Increment ANALYZER_VERSION when a change of the pipeline changes its results.
+# Changes of PARAMS are detected by their crc.
+ANALYZER_CACHE_NAME = "analyzer_cache.json"
+ANALYZER_VERSION = 6
+
+# Policies of the intermediate debug images, see ImageProcessor.write_indexed_img():
+# none are rendered, failures are rendered but only written for the images without a
+# signature, or all are written.
+DEBUG_IMAGES = [ "none", "failures", "all" ]
+DEBUG_IMAGES_DEFAULT = "all"
+
+# Hexagon search over PARAMS, see ImageProcessor.search_hexagon():
+# first uses the first hexagon found in PARAMS order, best evaluates all PARAMS in a
+# thread pool and uses the hexagon that best fits the contour of the first one.
+HEXAGON_SEARCH = [ "first", "best" ]
+HEXAGON_SEARCH_DEFAULT = "first"
+
 PARAMS = [
     {
         "blur_ksize": (11, 11),
@@ -83,6 +129,73 @@ def clamp(value:int, min_value:int, max_value:int) -> int:
     return max(min(value, max_value), min_value)
 
 
+def jpeg_size(path:str) -> Tuple[int, int]:
+    """
+    Returns the (width, height) from the frame header of a JPEG file without decoding it,
+    or None if the file is not a JPEG.
+    """
+    with open(path, "rb") as f:
+        if f.read(2) != b"\xff\xd8":
+            return None
+        while True:
+            if f.read(1) != b"\xff":
+                return None
+            marker = f.read(1)
+            while marker == b"\xff":
+                marker = f.read(1)
+            if not marker:
+                return None
+            marker = marker[0]
+            if marker == 0x01 or 0xD0 <= marker <= 0xD7:
+                continue # Markers without a segment
+            length = f.read(2)
+            if len(length) < 2:
+                return None
+            # SOF0..SOF15 except DHT, JPG and DAC
+            if 0xC0 <= marker <= 0xCF and marker not in (0xC4, 0xC8, 0xCC):
+                header = f.read(5)
+                if len(header) < 5:
+                    return None
+                _, height, width = struct.unpack(">BHH", header)
+                return (width, height)
+            if marker == 0xDA:
+                return None # Start of scan without a frame header
+            f.seek(struct.unpack(">H", length)[0] - 2, os.SEEK_CUR)
+
+
+class ImageChannels:
+    """
+    Provides the color spaces of one BGR image to the analysis steps. Each color space
+    is converted at most once, when first requested, and its split channels are shared.
+    The returned arrays are shared: callers must not modify them.
+    """
+    CONVERSIONS = {
+        "lab": cv2.COLOR_BGR2LAB,
+        "yuv": cv2.COLOR_BGR2YUV,
+        "hsv": cv2.COLOR_BGR2HSV,
+    }
+
+    def __init__(self, bgr_img:np.array):
+        self._images = { "bgr": bgr_img }
+        self._channels = {}
+
+    def image(self, space:str) -> np.array:
+        """Returns the image in the given color space: bgr, lab, yuv or hsv."""
+        img = self._images.get(space)
+        if img is None:
+            img = cv2.cvtColor(self._images["bgr"], self.CONVERSIONS[space])
+            self._images[space] = img
+        return img
+
+    def split(self, space:str) -> Tuple[np.array, np.array, np.array]:
+        """Returns the 3 channels of the image in the given color space."""
+        channels = self._channels.get(space)
+        if channels is None:
+            channels = tuple(cv2.split(self.image(space)))
+            self._channels[space] = channels
+        return channels
+
+
 class Cell:
     def __init__(self, triangle:Triangle, color:dict, mean_bgr:Tuple):
         self.triangle = triangle
@@ -103,11 +216,16 @@ class Cell:
 
 
 class ImageProcessor:
-    def __init__(self, input_img_path:str, output_dir_path:str):
+    def __init__(self, input_img_path:str, output_dir_path:str, debug_images:str=DEBUG_IMAGES_DEFAULT,
+                 hexagon_search:str=HEXAGON_SEARCH_DEFAULT, decode_margin:float=REDUCED_DECODE_MARGIN):
         self.input_img_path = input_img_path
         self.output_dir_path = output_dir_path
+        self.debug_images = debug_images
+        self.hexagon_search = hexagon_search
+        self.decode_margin = decode_margin
         self.img_index = 0
         self._previous_img_index = {}
+        self._pending_imgs = {}
 
         if not os.path.exists(output_dir_path):
             raise FileNotFoundError(f"Directory {output_dir_path} does not exist.")
@@ -120,70 +238,103 @@ class ImageProcessor:
             ext = _ext
         return os.path.join(self.output_dir_path, f"{name}{suffix}{ext}")
 
+    def has_debug_images(self) -> bool:
+        """Returns false if the debug images don't need to be rendered."""
+        return self.debug_images != "none"
+
     def write_indexed_img(self, suffix:str, in_img:np.array, replace:bool=False) -> None:
+        """
+        Writes an intermediate debug image, depending on the debug_images policy.
+        With "failures", a copy of the image is kept until flush_indexed_imgs().
+        """
+        if not self.has_debug_images():
+            return
         if replace and suffix in self._previous_img_index:
             dest_suffix = self._previous_img_index[suffix]
         else:
             self.img_index += 1
             dest_suffix = "_%02d_%s" % (self.img_index, suffix)
             self._previous_img_index[suffix] = dest_suffix
-        cv2.imwrite(self.dest_name(dest_suffix), in_img)
+        if self.debug_images == "failures":
+            self._pending_imgs[dest_suffix] = in_img.copy()
+        else:
+            cv2.imwrite(self.dest_name(dest_suffix), in_img)
+
+    def flush_indexed_imgs(self) -> None:
+        for dest_suffix, img in self._pending_imgs.items():
+            cv2.imwrite(self.dest_name(dest_suffix), img)
+        self._pending_imgs.clear()
 
-    def process_image(self, overwrite:bool) -> None:
+    def process_image(self, cached:dict=None) -> dict:
         print("------")
         print(f"Processing Image: {self.input_img_path}")
         print("------")
-        self.find_hexagon(self.input_img_path, overwrite)
+        detection = None
+        try:
+            detection = self.find_hexagon(self.input_img_path, cached)
+        finally:
+            # Only write the pending debug images of the images that failed.
+            if detection is None or detection["signature"] is None:
+                self.flush_indexed_imgs()
         print("")
-
-    def find_hexagon(self, input_img_path:str, overwrite:bool) -> None:
+        return detection
+
+    def find_hexagon(self, input_img_path:str, cached:dict=None) -> dict:
+        """
+        Finds the hexagon of the board, its cells and their signature, and writes the
+        output images. Returns the detection to record in the AnalyzerCache.
+        When cached is the detection of an image with the same content, e.g. a renamed or
+        duplicated photo, the hexagon search is skipped and only the cells are extracted.
+        """
         src_img_path = self.dest_name("_src")
+        sig_file = self.dest_name("_sig", ".txt")
 
-        # Check if the hexagon image already exists
-        if os.path.exists(src_img_path) and not overwrite:
-            print(f"Hexagon image already exists: {src_img_path}")
-            return
+        # Don't keep the signature of a previous version of this image
+        if os.path.exists(sig_file):
+            os.remove(sig_file)
 
         resized = self.load_resized_image(input_img_path)
-        # Disable auto-level upfront, it provides poor results.
-        channels = self.extract_channels(resized)
-        lab_img = self.convert_to_lab(resized)
-        # This image is only useful for debugging initial hexagon search
-        # self.write_indexed_img("lab", lab_img)
-        hex_img = resized.copy()
-
-        for params in PARAMS:
-            # Convert the image to LAB color space to enhance contrast
-            contrasted = self.enhance_image(lab_img, params)
-            self.write_indexed_img("contrast", contrasted, replace=True)
-
-            edges = self.edge_detect(contrasted, params)
-            self.write_indexed_img("edges", edges, replace=True)
-
-            if not params.get("use_edges", False):
-                edges = contrasted
-            hexagon = self.find_hexagon_contour(edges, draw_img=hex_img, params=params)
-            self.write_indexed_img("hexagon", hex_img, replace=True)
-
-            if hexagon is not None:
-                break
+        if cached is None:
+            found = self.search_hexagon(resized)
+        elif cached["hexagon"] is None:
+            found = None
+        else:
+            print("Hexagon cached")
+            hexagon = [ (np.int32(x), np.int32(y)) for x, y in cached["hexagon"] ]
+            found = (hexagon, cached["rotation"], tuple(cached["center"]))
+
+        detection = {
+            "hexagon": None,
+            "rotation": None,
+            "center": None,
+            "yrg": None,
+            "signature": None,
+        }
+        if found is not None:
+            hexagon, rot_angle_deg, hex_center = found
+            detection["hexagon"] = [ [int(x), int(y)] for x, y in hexagon ]
+            detection["rotation"] = rot_angle_deg
+            detection["center"] = [int(v) for v in hex_center]
 
-        if hexagon is not None:
-            rot_angle_deg, hex_center = self.detect_hexagon_rotation(hexagon, draw_img=hex_img)
             rot_img, rot_poly, hex_center = self.rotate_image(resized, hexagon, rot_angle_deg, hex_center)
-            self.write_indexed_img("hexagon", hex_img, replace=True)
             # self.write_indexed_img("rot", rot_img)
+            detection["yrg"] = {
+                "polygon": [ [int(x), int(y)] for x, y in rot_poly ],
+                "center": [int(v) for v in hex_center],
+            }
 
             yrg_coords = self.compute_yrg_coords(rot_poly, hex_center)
-            coords_img = rot_img.copy()
-            self.draw_yrg_coords_into(yrg_coords, dest_img=coords_img)
-            self.write_indexed_img("yrg", coords_img)
+            if self.has_debug_images():
+                coords_img = rot_img.copy()
+                self.draw_yrg_coords_into(yrg_coords, dest_img=coords_img)
+                self.write_indexed_img("yrg", coords_img)
 
             # Method 2: try to detect BW and color cells separately.
             cells = self.extract_cells_2(yrg_coords, in_img=rot_img)
-            bw_img = rot_img.copy()
-            self.draw_cells_into(cells=cells, dest_img=bw_img)
-            self.write_indexed_img("bw", bw_img)
+            if self.has_debug_images():
+                bw_img = rot_img.copy()
+                self.draw_cells_into(yrg_coords, cells=cells, dest_img=bw_img)
+                self.write_indexed_img("bw", bw_img)
 
             if self.validate_cells(cells):
                 # Detect the 3 white cells and re-orient the cells accordingly
@@ -191,22 +342,145 @@ class ImageProcessor:
                 result = self.orient_white_cells(yrg_coords, cells)
 
                 if result is not None:
-                    rot_col_img = rot_img.copy()
-                    self.draw_cells_into(cells=result, dest_img=rot_col_img)
-                    self.write_indexed_img("colors", rot_col_img)
+                    if self.has_debug_images():
+                        rot_col_img = rot_img.copy()
+                        self.draw_cells_into(yrg_coords, cells=result, dest_img=rot_col_img)
+                        self.write_indexed_img("colors", rot_col_img)
 
                     sig = self.cells_signature(result)
                     print(f"Signature: {sig}")
-                    sig_file = self.dest_name("_sig", ".txt")
                     with open(sig_file, "w") as f:
                         f.write(sig)
+                    detection["signature"] = sig
 
         cv2.imwrite(src_img_path, resized)
-        return
+        return detection
+
+    def search_hexagon(self, resized:np.array) -> Tuple[list, float, tuple]:
+        """
+        Tries the PARAMS to find the hexagon of the board.
+        The blur and brightness scaling are computed once for all the PARAMS that share them,
+        and so are the threshold, the contour search and the contour corners, so that PARAMS
+        which only differ by their polygon approximation cost one approxPolyDP.
+        See HEXAGON_SEARCH for the choice of the hexagon among the PARAMS.
+        Returns the hexagon polygon, its rotation angle in degrees and its center,
+        or None if no hexagon is found.
+        """
+        # Disable auto-level upfront, it provides poor results.
+        channels = ImageChannels(resized)
+        hex_img = None
+        if self.has_debug_images():
+            self.extract_channels(channels)
+            hex_img = resized.copy()
+        lab_img = self.convert_to_lab(channels)
+        # This image is only useful for debugging initial hexagon search
+        # self.write_indexed_img("lab", lab_img)
+        gray = cv2.cvtColor(lab_img, cv2.COLOR_BGR2GRAY)
+
+        blurred = {}    # blur_key() => blurred gray image
+        contours = {}   # contour_key() => (contrasted, edges, largest contour, its corners)
+        def _blur(params:dict) -> None:
+            key = self.blur_key(params)
+            if key not in blurred:
+                blurred[key] = self.blur_image(gray, params)
+        def _contour(params:dict) -> None:
+            key = self.contour_key(params)
+            if key not in contours:
+                contrasted = self.enhance_image(blurred[self.blur_key(params)], params)
+                edges = None
+                if params.get("use_edges", False) or self.has_debug_images():
+                    edges = self.edge_detect(contrasted, params)
+                bw = edges if params.get("use_edges", False) else contrasted
+                contour = self.find_largest_contour(bw)
+                corners = self.contour_corners(contour) if contour is not None else None
+                contours[key] = (contrasted, edges, contour, corners)
+
+        def _hexagon(params:dict, draw_img:np.array=None, log:Callable=print) -> list:
+            _, _, contour, corners = contours[self.contour_key(params)]
+            return self.find_hexagon_contour(contour, draw_img=draw_img, params=params, corners=corners, log=log)
+
+        def _candidate(params:dict) -> Tuple[list, list]:
+            messages = []
+            return messages, _hexagon(params, log=messages.append)
+
+        def _write_debug_images(params:dict) -> None:
+            contrasted, edges, _, _ = contours[self.contour_key(params)]
+            self.write_indexed_img("contrast", contrasted, replace=True)
+            if edges is not None:
+                self.write_indexed_img("edges", edges, replace=True)
+
+        hexagon = None
+        if self.hexagon_search == "best":
+            # Only the OpenCV calls release the GIL: contour_corners() is a Python loop that
+            # runs in one thread at a time.
+            # Each step only runs once per distinct key, before the steps depending on it.
+            with concurrent.futures.ThreadPoolExecutor(len(PARAMS)) as pool:
+                unique_blur = { self.blur_key(params): params for params in PARAMS }
+                list(pool.map(_blur, unique_blur.values()))
+                unique_contour = { self.contour_key(params): params for params in PARAMS }
+                list(pool.map(_contour, unique_contour.values()))
+                candidates = list(pool.map(_candidate, PARAMS))
+            # The messages of each candidate are printed in PARAMS order, not interleaved.
+            for messages, _ in candidates:
+                for message in messages:
+                    print(message)
+            found = [ index for index, (_, polygon) in enumerate(candidates) if polygon is not None ]
+            if found:
+                # All the hexagons are scored against the same contour, the one of the first
+                # hexagon found in PARAMS order, which is the hexagon used by "first".
+                reference = contours[self.contour_key(PARAMS[found[0]])][2]
+                score, index = min( (self.hexagon_score(candidates[index][1], reference, gray.shape), index)
+                                    for index in found )
+                print(f"Best hexagon: PARAMS[{index}] score {score:.4f}")
+                params = PARAMS[index]
+                _write_debug_images(params)
+                hexagon = _hexagon(params, draw_img=hex_img)
+                self.write_indexed_img("hexagon", hex_img, replace=True)
+        else:
+            for params in PARAMS:
+                _blur(params)
+                _contour(params)
+                _write_debug_images(params)
+                hexagon = _hexagon(params, draw_img=hex_img)
+                self.write_indexed_img("hexagon", hex_img, replace=True)
+
+                if hexagon is not None:
+                    break
+
+        if hexagon is None:
+            return None
+        rot_angle_deg, hex_center = self.detect_hexagon_rotation(hexagon, draw_img=hex_img)
+        self.write_indexed_img("hexagon", hex_img, replace=True)
+        return hexagon, rot_angle_deg, hex_center
+
+    def blur_key(self, params:dict) -> tuple:
+        """Returns the PARAMS used by blur_image()."""
+        return (params.get("blur_ksize", (11, 11)),
+                params.get("blur_sigmaX", 0),
+                params.get("brightness_scale", 3),
+                params.get("brightness_offset", 0))
+
+    def contour_key(self, params:dict) -> tuple:
+        """Returns the PARAMS used up to find_largest_contour()."""
+        key = self.blur_key(params) + (params.get("quantize_levels", 2), params.get("bw_threshold", 16))
+        if params.get("use_edges", False):
+            key += (params.get("canny_thresh1", 20), params.get("canny_thresh2", 30))
+        return key
 
     def load_resized_image(self, input_img_path:str) -> np.array:
-        # Load the image using OpenCV
-        image = cv2.imread(self.input_img_path, cv2.IMREAD_COLOR)
+        # Load the image using OpenCV.
+        # Large JPEG photos are decoded at the smallest scale that is still larger than
+        # RESIZE_PX by decode_margin. The smallest header dimension is used as the width
+        # since imread applies the EXIF orientation, which can swap the width and height.
+        flags = cv2.IMREAD_COLOR
+        size = jpeg_size(input_img_path) if self.decode_margin > 0 else None
+        if size is not None:
+            for scale, reduced_flags in REDUCED_DECODE_FLAGS:
+                if min(size) // scale >= self.decode_margin * RESIZE_PX:
+                    flags = reduced_flags
+                    print(f"Image decoded at 1/{scale} of {size[0]}x{size[1]}")
+                    break
+        image = cv2.imread(self.input_img_path, flags)
         if image is None:
             raise FileNotFoundError(f"Could not load image: {input_img_path}")
 
@@ -306,16 +580,13 @@ class ImageProcessor:
 
         return rgb_img
 
-    def extract_channels(self, rgb_img:np.array) -> list:
-        channels = {}
-        sy, sx = rgb_img.shape[:2]
-        b, g, r = cv2.split(rgb_img)
-        img = cv2.cvtColor(rgb_img, cv2.COLOR_BGR2LAB)
-        l_, a_, b_ = cv2.split(img)
-        img = cv2.cvtColor(rgb_img, cv2.COLOR_BGR2YUV)
-        y, u, v = cv2.split(img)
-        img = cv2.cvtColor(rgb_img, cv2.COLOR_BGR2HSV)
-        h_, s_, v_ = cv2.split(img)
+    def extract_channels(self, channels:ImageChannels) -> None:
+        # Only writes a debug mosaic of all the channels of the image.
+        sy, sx = channels.image("bgr").shape[:2]
+        b, g, r = channels.split("bgr")
+        l_, a_, b_ = channels.split("lab")
+        y, u, v = channels.split("yuv")
+        h_, s_, v_ = channels.split("hsv")
 
         # Recreate a gray scale image with all the channels, for debug purposes.
         gray = np.zeros((sy * 4, sx * 3), dtype=np.uint8)
@@ -352,18 +623,16 @@ class ImageProcessor:
         py = _copy(py, "HSV", h_, s_, v_)
         self.write_indexed_img("channels", gray)
 
-    def convert_to_lab(self, rgb_img:np.array) -> np.array:
-        # Convert the image to LAB color space to enhance contrast
-        lab_img = cv2.cvtColor(rgb_img, cv2.COLOR_BGR2LAB)
-        # Split the LAB image into its channels
-        l, a, b = cv2.split(lab_img)
+    def convert_to_lab(self, channels:ImageChannels) -> np.array:
+        # Use the LAB color space to enhance contrast
+        l, a, b = channels.split("lab")
         # Discard the luminance channel
-        l[:] = 0
+        l = np.zeros_like(l)
         lab_img = cv2.merge((l, a, b))
         rgb_img = cv2.cvtColor(lab_img, cv2.COLOR_LAB2BGR)
         return rgb_img
 
-    def enhance_image(self, lab:np.array, params:dict={}) -> np.array:
+    def blur_image(self, gray:np.array, params:dict={}) -> np.array:
         # # Apply CLAHE (Contrast Limited Adaptive Histogram Equalization) to the L channel
         # clahe = cv2.createCLAHE(clipLimit=2.0, tileGridSize=(8, 8))
         # a = clahe.apply(a)
@@ -374,9 +643,6 @@ class ImageProcessor:
         # lab = cv2.cvtColor(lab, cv2.COLOR_LAB2BGR)
         # self.write_indexed_img("enhance", lab)
 
-        # Convert the image to grayscale
-        gray = cv2.cvtColor(lab, cv2.COLOR_BGR2GRAY)
-
         # Apply GaussianBlur to reduce noise
         ksize = params.get("blur_ksize", (11, 11))
         sigmaX = params.get("blur_sigmaX", 0)
@@ -396,13 +662,15 @@ class ImageProcessor:
         min_gray = np.min(blurred)
         max_gray = np.max(blurred)
         print(f"Min gray level: {min_gray}, Max gray level: {max_gray}")
+        return blurred
 
+    def enhance_image(self, blurred:np.array, params:dict={}) -> np.array:
         quantize_levels = params.get("quantize_levels", 2)
         bw_thresh = params.get("bw_threshold", 16)
 
         if quantize_levels > 2:
             # Convert the image into N shades of grayscale
-            max_val = max_gray
+            max_val = np.max(blurred)
             step = max_val // (quantize_levels - 1)
             quantized = (blurred // step)
             quantized = np.clip(quantized, 0, 255)
@@ -431,16 +699,21 @@ class ImageProcessor:
 
         return edges
 
-    def find_hexagon_contour(self, bw_image:np.array, draw_img:np.array=None, params:dict={}) -> list:
+    def find_largest_contour(self, bw_image:np.array) -> np.array:
         # Find the largest contour in the threshold image
         # Possible choices for findContour are CHAIN_APPROX_SIMPLE and CHAIN_APPROX_TC89_L1.
         # The "simple" one seems to perform better for our post-analysis.
         cnts, _ = cv2.findContours(bw_image, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
         if len(cnts) == 0:
-            print("No contours found.")
             return None
         # Get the contour based on max contour area.
-        c = max(cnts, key=cv2.contourArea)
+        return max(cnts, key=cv2.contourArea)
+
+    def find_hexagon_contour(self, c:np.array, draw_img:np.array=None, params:dict={}, corners:np.array=None,
+                             log:Callable=print) -> list:
+        if c is None:
+            log("No contours found.")
+            return None
 
         if draw_img is not None:
             cv2.drawContours(draw_img, [c], -1, (0, 255, 0), 3)
@@ -448,7 +721,7 @@ class ImageProcessor:
             # Draw the bounding box on the image
             cv2.rectangle(draw_img, (x, y), (x + w, y + h), (255, 0, 0), 2)
 
-        approx = self.filter_hexagon(c, params)
+        approx = self.filter_hexagon(c, params, corners)
 
         if draw_img is not None:
             cv2.drawContours(draw_img, [approx], -1, (0, 255, 255), 4)
@@ -460,9 +733,9 @@ class ImageProcessor:
 
         # Check if we really found an hexagon
         if len(approx) == 6:
-            print("Hexagon detected!")
+            log("Hexagon detected!")
         else:
-            print(f"Hexagon not detected. Found {len(approx)} points.")
+            log(f"Hexagon not detected. Found {len(approx)} points.")
             return None
 
         # See filter_hexagon() for the Approx format.
@@ -470,13 +743,45 @@ class ImageProcessor:
         polygon = [ (point[0][0], point[0][1]) for point in approx ]
         return polygon
 
-    def filter_hexagon(self, contour:list, params:dict={}) -> list:
+    def hexagon_score(self, polygon:list, contour:np.array, shape:tuple) -> float:
+        """
+        Returns how badly the hexagon fits the contour, as 1 minus
+        the intersection over union of their areas in an image of the given shape.
+        Lower is better.
+        """
+        hexagon_mask = np.zeros(shape[:2], dtype=np.uint8)
+        contour_mask = hexagon_mask.copy()
+        cv2.fillPoly(hexagon_mask, [np.array(polygon, dtype=np.int32)], 1)
+        cv2.fillPoly(contour_mask, [contour], 1)
+        union = np.count_nonzero(hexagon_mask | contour_mask)
+        return 1 - np.count_nonzero(hexagon_mask & contour_mask) / union if union else 1
+
+    def filter_hexagon(self, contour:list, params:dict={}, corners:np.array=None) -> list:
         # Contour (input) and Approx (output of approxPolyDP) use an unusual structure:
         # it's an np.array of shape (num_points, 1, 2).
         # The python representation is:
         # list of [ list of a single [ list of x, y ] ]
         # e.g. [ [[x1, y1]], [[x2, y2]], [[x3, y3]], [[x4, y4]], [[x5, y5]], [[x6, y6]] ]
+        if corners is None:
+            corners = self.contour_corners(contour)
+        points = corners
+        (x, y, w, h) = cv2.boundingRect(contour)
+
+        # Note that [c] is not an hexagon. It may have thousands of points or more.
+        eps_w_ratio = params.get("polygon_eps_width_ratio", 1 / 20)
+        if eps_w_ratio > 0:
+            eps = w * eps_w_ratio
+        else:
+            eps = -1 * eps_w_ratio * cv2.arcLength(contour, True)
+        approx = cv2.approxPolyDP(curve=points, epsilon=eps, closed=True)
 
+        return approx
+
+    def contour_corners(self, contour:list) -> np.array:
+        """
+        Returns the points of the contour where its direction turns by 45 degrees or more,
+        the input of approxPolyDP in filter_hexagon(). This does not depend on the PARAMS.
+        """
         c = contour
         num_points = c.shape[0]
         angles = []
@@ -496,7 +801,6 @@ class ImageProcessor:
         curr_angle = 0
         points = [ c[0] ]
         threshold = 45
-        (x, y, w, h) = cv2.boundingRect(c)
 
         for idx in range(0, num_points):
             p1, deg = _p_angle(idx)
@@ -515,16 +819,7 @@ class ImageProcessor:
 
         points = np.array(points)
         # print("@@ points", points)
-
-        # Note that [c] is not an hexagon. It may have thousands of points or more.
-        eps_w_ratio = params.get("polygon_eps_width_ratio", 1 / 20)
-        if eps_w_ratio > 0:
-            eps = w * eps_w_ratio
-        else:
-            eps = -1 * eps_w_ratio * cv2.arcLength(contour, True)
-        approx = cv2.approxPolyDP(curve=points, epsilon=eps, closed=True)
-
-        return approx
+        return points
 
     def angle_vec(self, a:np.array) -> float:
         a_rad = math.atan2(a[1], a[0])
@@ -667,19 +962,14 @@ class ImageProcessor:
         return yrg_coords
 
     def draw_yrg_coords_into(self, yrg_coords:YRGCoord, dest_img:np.array) -> None:
-        t = yrg_coords.triangle(YRG(0, 0, 0))
-        radius = int(t.inscribed_circle_radius() *.5 )
+        geometry = yrg_coords.geometry()
+        radius = int(geometry.center_radius() *.5 )
 
-        for triangle in self.triangles(yrg_coords):
-            poly = np.int32(triangle.to_np_array())
+        for idx, poly in enumerate(geometry.cell_polygons):
             cv2.polylines(dest_img, [poly], isClosed=True, color=(255, 255, 255), thickness=2)
-            tc = triangle.center()
-            px = int(tc.x)
-            py = int(tc.y)
+            px, py = geometry.centers_int[idx]
             cv2.circle(dest_img, (px, py), radius, (255, 255, 255), 1)
-            y = triangle.yrg.y + coord.N//2
-            r = triangle.yrg.r + coord.N//2
-            g = triangle.yrg.g
+            y, r, g = geometry.yrg_abs[idx]
             cv2.putText(dest_img, f"{y}{r}{g}", (px - 15, py + 5), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 255), 1)
 
         # Draw the sides of the Y and R axis, for debug/validation purposes.
@@ -699,33 +989,15 @@ class ImageProcessor:
         cv2.polylines(dest_img, lines, isClosed=False, color=(255, 0, 0), thickness=2)
 
     def triangles(self, yrg_coords:YRGCoord) -> Generator:
-        n2 = coord.N//2
-        for (y, r, g) in coord.VALID_YRG:
-            y_piece = y - n2
-            r_piece = r - n2
-            yield yrg_coords.triangle(YRG(y_piece, r_piece, g))
-
-    def is_in_cells(self, triangle:Triangle, cells:list) -> bool:
-        yrg = triangle.yrg
-        for cell in cells:
-            if cell.triangle.yrg == yrg:
-                return True
-        return False
+        yield from yrg_coords.geometry().triangles
 
     def iter_triangles(self, yrg_coords:YRGCoord) -> Generator:
         # Returns a square (index, triangle, x1, y1, x2, y2) that can be used to extract colors.
-        radius = int(yrg_coords.triangle(YRG(0, 0, 0)).inscribed_circle_radius() * SHRINK_RATIO)
-        idx = 0
-        for triangle in self.triangles(yrg_coords):
-            # Create a square mask by actually cropping the channels directly.
-            # That seems a tad faster and actually more reliable.
-            cx, cy = triangle.center().to_int()
-            x1 = cx - radius
-            x2 = cx + radius
-            y1 = cy - radius
-            y2 = cy + radius
-            yield (idx, triangle, x1, y1, x2, y2)
-            idx += 1
+        # Create a square mask by actually cropping the channels directly.
+        # That seems a tad faster and actually more reliable.
+        geometry = yrg_coords.geometry()
+        for idx, (x1, y1, x2, y2) in enumerate(geometry.sample_rects(SHRINK_RATIO)):
+            yield (idx, geometry.triangles[idx], x1, y1, x2, y2)
 
     def extract_cells_2(self, yrg_coords:YRGCoord, in_img:np.array) -> list[Cell]:
         # Apply GaussianBlur to reduce noise
@@ -733,196 +1005,166 @@ class ImageProcessor:
         sigmaX = 10
         blur_img = cv2.GaussianBlur(in_img, ksize, sigmaX)
 
-        _b, _g, _r = cv2.split(blur_img)
-        tmp_img = cv2.cvtColor(blur_img, cv2.COLOR_BGR2Lab)
-        _l, _a, _  = cv2.split(tmp_img)
-        tmp_img = cv2.cvtColor(blur_img, cv2.COLOR_BGR2YUV)
-        _ , _u, _  = cv2.split(tmp_img)
-
-        mean_a = []
-        mean_l = []
-        mean_u = []
-        mean_r = []
-        for (idx, t, x1, y1, x2, y2) in self.iter_triangles(yrg_coords):
-            ca = _a[y1:y2, x1:x2]
-            cl = _l[y1:y2, x1:x2]
-            cu = _u[y1:y2, x1:x2]
-            cr = _r[y1:y2, x1:x2]
-            ma, ml, mu, mr = self.color_mean((ca, cl, cu, cr))
-            mean_a.append( int(ma) )
-            mean_l.append( int(ml) )
-            mean_u.append( int(mu) )
-            mean_r.append( int(mr) )
-
-        mean_a = np.array(mean_a).astype(np.uint8)
-        mean_l = np.array(mean_l).astype(np.uint8)
-        mean_u = np.array(mean_u).astype(np.uint8)
-        mean_r = np.array(mean_r).astype(np.uint8)
-
-        # Local support methods
-        tmp_img = in_img.copy()
-        tmp_img.fill(0)
-        def _draw_triangles(suffix:str, updated_channel:list):
-            for (idx, t, x1, y1, x2, y2) in self.iter_triangles(yrg_coords):
-                poly = np.int32(t.to_np_array())
+        channels = ImageChannels(blur_img)
+        _b, _g, _r = channels.split("bgr")
+        _l, _a, _  = channels.split("lab")
+
+        # Median of each channel of each cell, shape (num cells, 5).
+        medians = self.cell_medians(yrg_coords, cv2.merge((_b, _g, _r, _a, _l)))
+        median_bgr = medians[:, 0:3]
+        median_a, median_l, median_r = medians[:, (3, 4, 2)].astype(np.uint8).T
+
+        color_indices = self.classify_cells(yrg_coords, median_a, median_l, median_r, in_img)
+
+        # B & W cells first, then the others, each in cell order.
+        is_bw = color_indices <= CELL_COLORS.index("Black")
+        order = np.concatenate((np.flatnonzero(is_bw), np.flatnonzero(~is_bw)))
+        triangles = yrg_coords.geometry().triangles
+        cells = []
+        num_colors = {}
+        for idx in order.tolist():
+            name = CELL_COLORS[color_indices[idx]]
+            # The median color is just for display/debug purposes
+            cells.append(Cell(triangles[idx], colors.by_name(name), tuple(median_bgr[idx].tolist())))
+            num_colors[name] = num_colors.get(name, 0) + 1
+
+        print("@@ num colors:", num_colors)
+        return cells
+
+    def classify_cells(self, yrg_coords:YRGCoord,
+            median_a:np.array, median_l:np.array, median_r:np.array, in_img:np.array) -> np.array:
+        """
+        Classifies the cells from the medians of their A, L and R channels, knowing how many
+        cells of each color the board has. Each filter selects the N cells with the lowest
+        or highest channel values:
+        - Low A: Black and White cells. High L: White cells.
+        - High R among the other cells: Orange cells.
+        - High L among the other cells, with the Orange ones: Orange and Yellow cells.
+        The remaining cells are Red.
+        Returns the index in CELL_COLORS of the color of each cell.
+        """
+        num_cells = len(median_a)
+        # Debug images of each filter
+        tmp_img = None
+        def _draw_triangles(suffix:str, updated_channel:np.array):
+            nonlocal tmp_img
+            if not self.has_debug_images():
+                return
+            if tmp_img is None:
+                tmp_img = np.zeros_like(in_img)
+            for idx, poly in enumerate(yrg_coords.geometry().cell_polygons):
                 gray = int(updated_channel[idx])
                 cv2.fillPoly(tmp_img, [poly], (gray, gray, gray))
                 gray = 64 if gray < 128 else 192
                 cv2.polylines(tmp_img, [poly], isClosed=True, color=(gray, gray, gray), thickness=1)
             self.write_indexed_img(suffix, tmp_img)
 
-        def _filter_channel(label:str,
-                source:np.array,
+        def _filter_channel(source:np.array,
                 find_high:bool,
                 expected_count:int,
-                exclude:list[int]=None,
-                include:list[int]=None):
-            # Coef 1 starts at min (find low) or max (find high) and coef 0 ends at median.
-            # Excluded indices: we already know their color and wish to exclude them from
-            #   all processing here, including the min/max computations.
-            # Included indices: we already know their colors and we already know they are
-            #   part of the desired solution, but we should not use them when sorting.
-            #   These values are part of the "expected_count".
-            input_ = source.copy()
-            if include is None: include = []
-            if exclude is None: exclude = []
-            included_ = []
-            for i,v in enumerate(input_):
-                if i not in exclude:
-                    included_.append( [i, float(v)] )
-            # print(f"@@ {label} source:", str(included_))
-
-            updated_ = input_.copy()
-            target_ = 255 if find_high else 0
-            updated_.fill(255 - target_)
-
-            # Just take the N higher (find_high) or lower elements
-            included_.sort(key=lambda x: x[1], reverse=find_high)
-
-            for i in include:
-                # We already know we want this index
-                updated_[i] = target_
-                expected_count -= 1
-            included_ = [ [i,v] for i,v in included_ if i not in include ]
-            for i, v in included_[:expected_count]:
-                updated_[i] = target_
-            # print(f"@@ {label} updated:", str(updated_).replace("\n", ""))
-
-            return updated_
-
-        # Filter A to detect both black and white cells
+                exclude:np.array=None,
+                include:np.array=None) -> np.array:
+            # Returns 255 (find_high) or 0 (find low) for the expected_count cells with the
+            # highest or lowest values, and the opposite for the other cells.
+            # Excluded cells (boolean mask): we already know their color and wish to exclude
+            #   them from all processing here.
+            # Included cells (boolean mask): we already know their colors and we already know
+            #   they are part of the desired solution, but we should not use them when sorting.
+            #   These cells are part of the "expected_count".
+            target = 255 if find_high else 0
+            updated = np.full(num_cells, 255 - target, dtype=np.uint8)
+            # Unique sort keys, lowest first: equal values are taken in cell order.
+            values = source.astype(np.int64)
+            keys = (255 - values if find_high else values) * 64 + np.arange(num_cells)
+            candidates = np.ones(num_cells, dtype=bool)
+            if exclude is not None:
+                candidates &= ~exclude
+            if include is not None:
+                updated[include] = target
+                expected_count -= int(np.count_nonzero(include))
+                candidates &= ~include
+            keys = keys[candidates]
+            count = min(max(expected_count, 0), len(keys))
+            if count > 0:
+                selected = np.flatnonzero(candidates)[np.argpartition(keys, count - 1)[:count]]
+                updated[selected] = target
+            return updated
 
         expected_counts = colors.EXPECTED_NUM_CELLS
+        color_indices = np.full(num_cells, CELL_COLORS.index("Red"), dtype=np.uint8)
 
-        updated_a = _filter_channel("A", mean_a,
+        # Filter A to detect both black and white cells
+        updated_a = _filter_channel(median_a,
                         find_high=False,
                         expected_count=expected_counts["White"] + expected_counts["Black"])
         _draw_triangles("va_b_w", updated_a)
 
         # Filter L to detect only white cells
-
-        updated_l = _filter_channel("L", mean_l,
+        updated_l = _filter_channel(median_l,
                         find_high=True,
                         expected_count=expected_counts["White"])
         _draw_triangles("vl_w", updated_l)
 
         # Combine both filters to get the B & W cells
+        is_white = updated_l == 255
+        is_bw = is_white | (updated_a == 0)
+        color_indices[is_bw] = CELL_COLORS.index("Black")
+        color_indices[is_white] = CELL_COLORS.index("White")
 
-        cells = []
-        exclude_idx = []
-        num_colors = {}
-        for (idx, t, x1, y1, x2, y2) in self.iter_triangles(yrg_coords):
-            va = int(updated_a[idx]) # 0 if Black or White
-            vl = int(updated_l[idx]) # 255 if White
-            name = None
-            if vl == 255:
-                name = "White"
-            elif va == 0:
-                name = "Black"
-
-            if name is not None:
-                # Get a mean color just for display/debug purposes
-                cr = _r[y1:y2, x1:x2]
-                cg = _g[y1:y2, x1:x2]
-                cb = _b[y1:y2, x1:x2]
-                mean_bgr = self.color_mean((cb, cg, cr))
-
-                color = colors.by_name(name)
-                cells.append(Cell(t, color, mean_bgr))
-                exclude_idx.append(idx)
-                num_colors[name] = num_colors.get(name, 0) + 1
-
-        # Filter U/R to detect orange cells
+        # Filter R to detect orange cells
         # Ignore B & W cells found above.
-
-        updated_r = _filter_channel("R", mean_r,
+        updated_r = _filter_channel(median_r,
                         find_high=True,
-                        exclude=exclude_idx,
+                        exclude=is_bw,
                         expected_count=expected_counts["Orange"])
         _draw_triangles("vr_o", updated_r)
-        include_idx = [ i for i, v in enumerate(updated_r) if v == 255 ]
+        is_orange = updated_r == 255
 
-        updated_l = _filter_channel("L", mean_l,
+        updated_l = _filter_channel(median_l,
                         find_high=True,
-                        include=include_idx,
-                        exclude=exclude_idx,
+                        include=is_orange,
+                        exclude=is_bw,
                         expected_count=expected_counts["Orange"] + expected_counts["Yellow"])
         _draw_triangles("vl_o_y", updated_l)
 
         # Combine both filters to get the Orange, Yellow, and Red cells
-
-        for (idx, t, x1, y1, x2, y2) in self.iter_triangles(yrg_coords):
-            if self.is_in_cells(t, cells):
-                continue
-
-            # vu = int(updated_u[idx]) # 0 if Orange or Yellow
-            vl = int(updated_l[idx]) # 255 if Orange or Yellow
-            vr = int(updated_r[idx]) # 255 if Orange
-            name = None
-            # if vu == 0:
-            if vr == 255:
-                name = "Orange"
-            elif vl == 255:
-                name = "Yellow"
-            else:
-                name = "Red"
-
-            if name is not None:
-                # Get a mean color just for display/debug purposes
-                cr = _r[y1:y2, x1:x2]
-                cg = _g[y1:y2, x1:x2]
-                cb = _b[y1:y2, x1:x2]
-                mean_bgr = self.color_mean((cb, cg, cr))
-
-                color = colors.by_name(name)
-                cells.append(Cell(t, color, mean_bgr))
-                exclude_idx.append(idx)
-                num_colors[name] = num_colors.get(name, 0) + 1
-
-        print("@@ num colors:", num_colors)
-        return cells
-
-    def color_mean(self, channels:Tuple) -> list:
-        # Input array: list of N np.array split channels (HSV, LAB, etc)
-        # Output array: N components (average per component)
-        r = []
-        for channel in channels:
-            med = np.median(channel, overwrite_input=True)
-            r.append(med)
-        return r
-
-    def draw_cells_into(self, cells:list[Cell], dest_img:np.array) -> None:
+        is_yellow = ~is_bw & ~is_orange & (updated_l == 255)
+        color_indices[is_orange] = CELL_COLORS.index("Orange")
+        color_indices[is_yellow] = CELL_COLORS.index("Yellow")
+        return color_indices
+
+    def cell_medians(self, yrg_coords:YRGCoord, channels:np.array) -> np.array:
+        """
+        Returns the median of each channel in the sample rect of each cell (see iter_triangles),
+        as an array of shape (num cells, num channels).
+        The sample rects all have the same size, so their pixels are gathered in a single
+        (num cells, size, size, num channels) array and all the medians are computed at once.
+        The pixels of rects that cross the image border are clamped to the border.
+        """
+        h, w = channels.shape[:2]
+        if channels.ndim == 2:
+            channels = channels[:, :, np.newaxis]
+        rects = np.array(yrg_coords.geometry().sample_rects(SHRINK_RATIO))
+        offsets = np.arange(rects[0, 2] - rects[0, 0])
+        ys = np.clip(rects[:, 1, np.newaxis] + offsets, 0, h - 1)
+        xs = np.clip(rects[:, 0, np.newaxis] + offsets, 0, w - 1)
+        patches = channels[ys[:, :, np.newaxis], xs[:, np.newaxis, :]]
+        return np.median(patches, axis=(1, 2))
+
+    def draw_cells_into(self, yrg_coords:YRGCoord, cells:list[Cell], dest_img:np.array) -> None:
         dest_img.fill(0)
         if len(cells) == 0:
             return
-        radius = int(cells[0].triangle.inscribed_circle_radius() *.5 )
+        geometry = yrg_coords.geometry()
+        radius = int(geometry.center_radius() *.5 )
 
         for cell in cells:
             # We can either display the mean HSV or the mean LAB for validation purposes.
 
-            poly = np.int32(cell.triangle.to_np_array())
+            idx = coord.VALID_YRG_TO_IDX[cell.yrg().to_abs()]
+            poly = geometry.cell_polygons[idx]
             cv2.fillPoly(dest_img, [poly], cell.mean_bgr)
-            cv2.circle(dest_img, cell.triangle.center().to_int(), radius, cell.color["bgr"], -1)
+            cv2.circle(dest_img, geometry.centers_int[idx], radius, cell.color["bgr"], -1)
             cv2.polylines(dest_img, [poly], isClosed=True, color=(0, 0, 0), thickness=1)
 
     def rotate_cells_60_ccw(self, yrg_coords:YRGCoord, cells:list[Cell]) -> None:
@@ -1015,14 +1257,15 @@ class ImageProcessor:
             return None
         results = []
         n2 = coord.N//2
+        by_yrg = {}
+        for cell in cells:
+            by_yrg.setdefault(cell.yrg(), cell)
         for y, r, g in VALID_YRG:
-            yrg = YRG(y - n2, r - n2, g)
-
-            cell = [ cell for cell in cells if cell.yrg() == yrg ]
-            if len(cell) == 0:
-                resuklts.append("-")
+            cell = by_yrg.get(YRG(y - n2, r - n2, g))
+            if cell is None:
+                results.append("-")
             else:
-                color = cell[0].color_name()
+                color = cell.color_name()
                 # First letter of the color name is enough to distinguish it
                 color = color[0].upper()
                 results.append(color)
@@ -1035,4 +1278,146 @@ class ImageProcessor:
         return (int(b), int(g), int(r))
 
 
+def _init_analyze_worker() -> None:
+    # Each worker process analyzes one image at a time: parallelism comes from the pool.
+    cv2.setNumThreads(1)
+
+def analyze_image(input_img_path:str, output_dir_path:str, cached:dict=None,
+                  debug_images:str=DEBUG_IMAGES_DEFAULT, hexagon_search:str=HEXAGON_SEARCH_DEFAULT,
+                  decode_margin:float=REDUCED_DECODE_MARGIN, capture:bool=False) -> dict:
+    """
+    Processes one image, as done by a worker process for main.py -d --jobs.
+    Errors are reported in the result instead of stopping the other images.
+    When capture is set, the image log is returned in the result instead of being printed.
+    Returns a dict with the input path, detection (see find_hexagon), log, elapsed time
+    in seconds and error message.
+    """
+    ts = time.time()
+    log = io.StringIO()
+    detection = None
+    error = None
+    with contextlib.redirect_stdout(log) if capture else contextlib.nullcontext():
+        try:
+            detection = ImageProcessor(input_img_path, output_dir_path, debug_images, hexagon_search, decode_margin).process_image(cached)
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+            print(f"Error processing {input_img_path}")
+            traceback.print_exc(file=sys.stdout)
+    return {
+        "input": input_img_path,
+        "basename": os.path.splitext(os.path.basename(input_img_path))[0],
+        "detection": detection,
+        "log": log.getvalue(),
+        "elapsed": time.time() - ts,
+        "error": error,
+    }
+
+def file_sha256(path:str) -> str:
+    """Returns the hex SHA-256 of the content of the file."""
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+def params_crc() -> int:
+    return zlib.crc32(repr(PARAMS).encode())
+
+
+class AnalyzerCache:
+    """
+    Persistent cache of the image analysis, stored as JSON in the output dir.
+    The detections are keyed by the SHA-256 of the source image content: an image is
+    only processed again when its content changes, and a renamed or duplicated image
+    reuses the detection of the same content instead of searching its hexagon again.
+    Each output name maps to the hash of the image it was last processed from, and to the
+    debug_images policy of that run: an image is processed again when a run needs debug
+    images that its outputs do not have, e.g. with "all" after a run with "none".
+    The debug images of the hexagon search are not cached, so a detection is not reused
+    when the policy needs them.
+    The whole cache is discarded when ANALYZER_VERSION, PARAMS, the hexagon search or the
+    decode margin change.
+    Errors are not cached, so these images are processed again on the next run.
+    """
+    def __init__(self, output_dir_path:str, hexagon_search:str=HEXAGON_SEARCH_DEFAULT,
+                 decode_margin:float=REDUCED_DECODE_MARGIN):
+        self.output_dir_path = output_dir_path
+        self.hexagon_search = hexagon_search
+        self.decode_margin = decode_margin
+        self.path = os.path.join(output_dir_path, ANALYZER_CACHE_NAME)
+        self.images = {}    # sha256 => detection, see ImageProcessor.find_hexagon()
+        self.names = {}     # output basename => sha256
+        self.debug_images = {}  # output basename => debug_images policy of its outputs
+        self.load()
+
+    def load(self) -> None:
+        try:
+            with open(self.path, "r") as f:
+                cache = json.load(f)
+        except FileNotFoundError:
+            return
+        if (cache.get("version") != ANALYZER_VERSION
+                or cache.get("params") != params_crc()
+                or cache.get("hexagon_search", HEXAGON_SEARCH_DEFAULT) != self.hexagon_search
+                or cache.get("decode_margin", REDUCED_DECODE_MARGIN) != self.decode_margin):
+            print(f"Analyzer cache is outdated, all images will be processed: {self.path}")
+            return
+        self.images = cache["images"]
+        self.names = cache["names"]
+        self.debug_images = cache.get("debug_images", {})
+
+    def save(self) -> None:
+        """Atomically writes the cache file, without the detections no output name uses anymore."""
+        shas = set(self.names.values())
+        cache = {
+            "version": ANALYZER_VERSION,
+            "params": params_crc(),
+            "hexagon_search": self.hexagon_search,
+            "decode_margin": self.decode_margin,
+            "images": { sha: detection for sha, detection in self.images.items() if sha in shas },
+            "names": self.names,
+            "debug_images": self.debug_images,
+        }
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(cache, f)
+        os.replace(tmp_path, self.path)
+
+    def is_current(self, basename:str, sha:str, debug_images:str=DEBUG_IMAGES_DEFAULT) -> bool:
+        """
+        Returns true if the outputs of basename were generated from the image with this hash,
+        with a debug_images policy that writes at least the debug images of this one.
+        """
+        return (self.names.get(basename) == sha
+                and sha in self.images
+                and DEBUG_IMAGES.index(self.debug_images.get(basename, "none")) >= DEBUG_IMAGES.index(debug_images)
+                and os.path.exists(os.path.join(self.output_dir_path, f"{basename}_src.jpg")))
+
+    def get(self, sha:str, debug_images:str=DEBUG_IMAGES_DEFAULT) -> dict:
+        """
+        Returns the detection of the image with this hash, or None if the hexagon search must
+        run to write the debug images of the policy: always with "all", and with "failures"
+        for the images without a signature.
+        """
+        detection = self.images.get(sha)
+        if (detection is None
+                or debug_images == "all"
+                or (debug_images == "failures" and detection["signature"] is None)):
+            return None
+        return detection
+
+    def put(self, basename:str, sha:str, detection:dict, debug_images:str=DEBUG_IMAGES_DEFAULT,
+            searched:bool=True) -> None:
+        """
+        Records the detection of the outputs of basename. When the hexagon search did not run,
+        the outputs have none of its debug images, which only meets "failures" for an image
+        with a signature.
+        """
+        self.images[sha] = detection
+        self.names[basename] = sha
+        if not searched and debug_images != "none":
+            debug_images = "failures" if detection["signature"] is not None else "none"
+        self.debug_images[basename] = debug_images
+
+
 # ~~
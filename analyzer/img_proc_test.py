@@ -0,0 +1,136 @@
+# Tangram Puzzle Image Analyzer
+#
+# (c) 2025 ralfoide at gmail
+
+import contextlib
+import cv2
+import io
+import numpy as np
+import os
+import shutil
+import struct
+import tempfile
+import unittest
+from unittest import mock
+import img_proc
+from img_proc import AnalyzerCache, ImageProcessor, jpeg_size
+
+def segment(marker:int, payload:bytes) -> bytes:
+    """Returns a JPEG marker segment with its length."""
+    return bytes([ 0xFF, marker ]) + struct.pack(">H", len(payload) + 2) + payload
+
+def sof(marker:int, width:int, height:int) -> bytes:
+    """Returns a frame header segment with 8 bits precision and 3 components."""
+    return segment(marker, struct.pack(">BHHB", 8, height, width, 3) + bytes(9))
+
+# A JPEG thumbnail of 160x120, as embedded in the EXIF APP1 segment of photos.
+THUMBNAIL = b"\xff\xd8" + sof(0xC0, 160, 120) + b"\xff\xd9"
+
+
+class JpegSizeTest(unittest.TestCase):
+    def setUp(self):
+        self.output_dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.output_dir, "image.jpg")
+
+    def tearDown(self):
+        shutil.rmtree(self.output_dir)
+
+    def size(self, data:bytes):
+        with open(self.path, "wb") as f:
+            f.write(data)
+        return jpeg_size(self.path)
+
+    def test_encoded(self):
+        img = np.zeros( (30, 40, 3), dtype=np.uint8 )
+        _, data = cv2.imencode(".jpg", img)
+        self.assertEqual(self.size(data.tobytes()), (40, 30))
+        _, data = cv2.imencode(".jpg", img, [ cv2.IMWRITE_JPEG_PROGRESSIVE, 1 ])
+        self.assertEqual(self.size(data.tobytes()), (40, 30))
+
+    def test_exif_thumbnail(self):
+        # The SOF of the thumbnail inside APP1 must be skipped with its segment.
+        app1 = segment(0xE1, b"Exif\0\0" + THUMBNAIL)
+        self.assertEqual(self.size(b"\xff\xd8" + app1 + sof(0xC0, 4032, 3024)), (4032, 3024))
+
+    def test_markers(self):
+        # Fill bytes before a marker, and the TEM and RST markers that have no segment.
+        data = b"\xff\xd8" + b"\xff\xff\xff\x01" + b"\xff\xd0" + b"\xff\xff" + sof(0xC2, 3024, 4032)[1:]
+        self.assertEqual(self.size(data), (3024, 4032))
+        # DHT, JPG and DAC are in the SOF range but are not frame headers.
+        data = b"\xff\xd8" + segment(0xC4, bytes(5)) + segment(0xCC, bytes(2)) + sof(0xC2, 800, 600)
+        self.assertEqual(self.size(data), (800, 600))
+
+    def test_not_jpeg(self):
+        _, data = cv2.imencode(".png", np.zeros( (30, 40, 3), dtype=np.uint8 ))
+        self.assertIsNone(self.size(data.tobytes()))
+        self.assertIsNone(self.size(b""))
+        # A scan without a frame header, a truncated frame header and a missing marker.
+        self.assertIsNone(self.size(b"\xff\xd8" + segment(0xDA, bytes(10))))
+        self.assertIsNone(self.size(b"\xff\xd8" + sof(0xC0, 800, 600)[:7]))
+        self.assertIsNone(self.size(b"\xff\xd8" + segment(0xE0, bytes(14)) + b"\x00"))
+
+    def test_decode_margin(self):
+        # A 12 MP photo header: only decoded at 1/2 with a margin of at most 1512 / RESIZE_PX.
+        self.size(b"\xff\xd8" + sof(0xC0, 4032, 3024))
+        expected = {
+            2: cv2.IMREAD_COLOR,
+            1.4: cv2.IMREAD_REDUCED_COLOR_2,
+            0.5: cv2.IMREAD_REDUCED_COLOR_4,
+            0.3: cv2.IMREAD_REDUCED_COLOR_8,
+            0: cv2.IMREAD_COLOR,
+        }
+        for margin, flags in expected.items():
+            with self.subTest(margin=margin):
+                processor = ImageProcessor(self.path, self.output_dir, decode_margin=margin)
+                with mock.patch.object(img_proc.cv2, "imread", return_value=np.zeros( (378, 504, 3), dtype=np.uint8 )) as imread:
+                    with contextlib.redirect_stdout(io.StringIO()):
+                        img = processor.load_resized_image(self.path)
+                imread.assert_called_once_with(self.path, flags)
+                self.assertEqual(img.shape, (768, 1024, 3))
+
+
+class AnalyzerCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.output_dir = tempfile.mkdtemp()
+        self.found = { "hexagon": [ [0, 0] ] * 6, "rotation": 0, "center": [0, 0], "yrg": None, "signature": "RB" }
+        self.failed = dict(self.found, signature=None)
+
+    def tearDown(self):
+        shutil.rmtree(self.output_dir)
+
+    def put(self, basename:str, sha:str, detection:dict, debug_images:str, searched:bool) -> AnalyzerCache:
+        """Records an analysis, and returns the cache as loaded by the next run."""
+        cache = AnalyzerCache(self.output_dir)
+        cache.put(basename, sha, detection, debug_images, searched)
+        cache.save()
+        with open(os.path.join(self.output_dir, f"{basename}_src.jpg"), "wb"):
+            pass
+        return AnalyzerCache(self.output_dir)
+
+    def test_search_debug_images(self):
+        cache = self.put("a", "sha_a", self.found, "all", True)
+        self.assertTrue(cache.is_current("a", "sha_a", "all"))
+        # The detection can't write the search debug images of another name.
+        self.assertIsNone(cache.get("sha_a", "all"))
+        self.assertEqual(cache.get("sha_a", "failures"), self.found)
+        self.assertEqual(cache.get("sha_a", "none"), self.found)
+
+        # A copy analyzed from the cached detection only meets "failures".
+        cache = self.put("b", "sha_a", self.found, "all", False)
+        self.assertTrue(cache.is_current("b", "sha_a", "failures"))
+        self.assertFalse(cache.is_current("b", "sha_a", "all"))
+
+    def test_failed_debug_images(self):
+        cache = self.put("a", "sha_a", self.failed, "failures", True)
+        self.assertTrue(cache.is_current("a", "sha_a", "failures"))
+        self.assertIsNone(cache.get("sha_a", "failures"))
+        self.assertEqual(cache.get("sha_a", "none"), self.failed)
+        cache = self.put("b", "sha_a", self.failed, "failures", False)
+        self.assertFalse(cache.is_current("b", "sha_a", "failures"))
+        self.assertTrue(cache.is_current("b", "sha_a", "none"))
+
+
+if __name__ == "__main__":
+    unittest.main()
+
+# ~~
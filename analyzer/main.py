@@ -3,14 +3,18 @@
 # (c) 2025 ralfoide at gmail
 
 import argparse
+import collections
+import concurrent.futures
 import glob
 import json
 import os
 import time
 import sys
 
-from gen import Generator
-from img_proc import ImageProcessor
+from gen import Generator, convert_solutions, GEN_MEMO_SIZE
+from img_proc import AnalyzerCache, analyze_image, file_sha256, _init_analyze_worker, DEBUG_IMAGES, DEBUG_IMAGES_DEFAULT
+from img_proc import HEXAGON_SEARCH, HEXAGON_SEARCH_DEFAULT, REDUCED_DECODE_MARGIN
+from metrics import GEN_METRICS_INTERVAL
 from pieces_stats import PiecesStats
 
 TABLE_PLACEHOLDER = "TABLE_PLACEHOLDER"
@@ -35,6 +39,18 @@ class Main:
         parser.add_argument("-y", "--overwrite",
             action="store_true",
             help="Overwrite existing files")
+        parser.add_argument("--debug-images",
+            choices=DEBUG_IMAGES,
+            default=DEBUG_IMAGES_DEFAULT,
+            help="Analyzer intermediate images: none, only for the images without a signature (failures), or all")
+        parser.add_argument("--hexagon-search",
+            choices=HEXAGON_SEARCH,
+            default=HEXAGON_SEARCH_DEFAULT,
+            help="Analyzer hexagon search: first uses the first parameters that find an hexagon, best tries all of them in a thread pool and keeps the hexagon that best fits the contour of the first one")
+        parser.add_argument("--decode-margin",
+            type=float,
+            default=REDUCED_DECODE_MARGIN,
+            help="Analyzer JPEG decode: large photos are decoded at 1/2, 1/4 or 1/8 when that is still this many times larger than the analyzed size (0 to always decode the full image)")
         parser.add_argument("-g", "--generate",
             action="store_true",
             help="Action: Generate all possible solutions")
@@ -53,6 +69,53 @@ class Main:
             type=int,
             default=1,
             help="Generator start permutation index")
+        parser.add_argument("--gen-solver",
+            choices=["perm", "dlx", "cells"],
+            default="perm",
+            help="Generator solver: perm iterates all pieces permutations, dlx solves the exact cover problem in one pass, cells is the same branching on the most constrained cell")
+        parser.add_argument("-j", "--jobs",
+            type=int,
+            default=1,
+            help="Number of worker processes for the generator and the input dir analysis (0 for all CPUs)")
+        parser.add_argument("--gen-symmetry",
+            choices=["full", "expand", "canonical"],
+            default="full",
+            help="Generator symmetry: full searches all solutions, expand and canonical only search half of them (dlx and cells solvers) and respectively output both mirror images or only one")
+        parser.add_argument("--gen-mode",
+            choices=["count", "sig", "bin", "full"],
+            default="full",
+            help="Generator output: count only keeps the totals, sig only writes the solution signatures, bin writes the solutions in a binary store next to the output, full also renders and logs each solution")
+        parser.add_argument("--gen-memo",
+            type=int,
+            default=GEN_MEMO_SIZE,
+            help="Generator perm solver transposition table size in MB per process (0 to disable)")
+        parser.add_argument("--gen-metrics",
+            default="",
+            help="Generator metrics JSON lines file name in output dir (empty to disable)")
+        parser.add_argument("--gen-metrics-interval",
+            type=float,
+            default=GEN_METRICS_INTERVAL,
+            help="Generator metrics sampling interval in seconds")
+        parser.add_argument("--gen-metrics-port",
+            type=int,
+            default=0,
+            help="Generator metrics HTTP port on localhost (0 to disable)")
+        parser.add_argument("--resume",
+            action="store_true",
+            help="Generator: resume from the last checkpoint of the output file")
+        parser.add_argument("--gen-placements",
+            default="placements.bin",
+            help="Generator placement table cache name in output dir (empty to disable)")
+        parser.add_argument("--convert-solutions",
+            required=False,
+            help="Action: Convert a generator text output into a binary solution store (.bin)")
+        parser.add_argument("--merge-solutions",
+            nargs="+",
+            required=False,
+            help="Action: Merge generator outputs (text or .bin) into a sorted binary solution store without duplicates")
+        parser.add_argument("--merge-output",
+            default="solutions.bin",
+            help="Merged binary solution store name in output dir")
         parser.add_argument("-p", "--pieces",
             action="store_true",
             help="Action: Compute pieces statistics")
@@ -62,9 +125,84 @@ class Main:
             help="Input solutions txt for pieces generation")
         self.args = parser.parse_args()
 
-    def analyze_file(self, input_file_path:str, outout_dir_path:str) -> None:
-        p = ImageProcessor(input_file_path, outout_dir_path)
-        p.process_image(m.args.overwrite)
+    def analyze_file(self, input_file_path:str, outout_dir_path:str) -> list:
+        return self.analyze_files([ input_file_path ], outout_dir_path, 1)
+
+    def analyze_files(self, input_file_paths:list, outout_dir_path:str, jobs:int) -> list:
+        """
+        Processes the input images that are new or changed since the last run, according to
+        the AnalyzerCache of the output dir, or all of them with --overwrite.
+        Images with the same content as an image analyzed before reuse its detection. In this
+        run, they wait for the first of them to be analyzed instead of searching its hexagon too.
+        Uses a pool of jobs worker processes when jobs > 1. At most 2 images per worker are
+        queued at a time. The log of each image is printed in one block when it completes.
+        Returns the analyze_image() result of each processed image.
+        """
+        cache = AnalyzerCache(outout_dir_path, m.args.hexagon_search, m.args.decode_margin)
+        todo = []
+        for input_file_path in input_file_paths:
+            sha = file_sha256(input_file_path)
+            basename = os.path.splitext(os.path.basename(input_file_path))[0]
+            if m.args.overwrite or not cache.is_current(basename, sha, m.args.debug_images):
+                todo.append( (input_file_path, sha) )
+        if len(todo) < len(input_file_paths):
+            print(f"Unchanged images: {len(input_file_paths) - len(todo)}")
+
+        results = []
+        analyzed = set()    # sha256 of the images analyzed in this run
+        def _cached(sha:str) -> dict:
+            if m.args.overwrite and sha not in analyzed:
+                return None
+            return cache.get(sha, m.args.debug_images)
+
+        def _add_result(result:dict, sha:str, searched:bool) -> None:
+            results.append(result)
+            if result["error"] is None:
+                cache.put(result["basename"], sha, result["detection"], m.args.debug_images, searched)
+                analyzed.add(sha)
+
+        try:
+            if jobs <= 1:
+                for input_file_path, sha in todo:
+                    cached = _cached(sha)
+                    _add_result(analyze_image(input_file_path, outout_dir_path, cached, m.args.debug_images, m.args.hexagon_search, m.args.decode_margin), sha, cached is None)
+                return results
+
+            print(f"Analyzing {len(todo)} images with {jobs} jobs")
+            todo_iter = iter(todo)
+            ready = collections.deque()     # (input_file_path, sha) no longer waiting for a search
+            searching = set()   # sha256 of the images being searched
+            waiting = {}        # sha256 => input_file_path list waiting for its search
+            pending = {}        # future => (sha256, searched)
+            with concurrent.futures.ProcessPoolExecutor(jobs, initializer=_init_analyze_worker) as pool:
+                while True:
+                    while len(pending) < 2 * jobs:
+                        item = ready.popleft() if ready else next(todo_iter, None)
+                        if item is None:
+                            break
+                        input_file_path, sha = item
+                        cached = _cached(sha)
+                        if cached is None:
+                            if sha in searching:
+                                waiting.setdefault(sha, []).append(input_file_path)
+                                continue
+                            searching.add(sha)
+                        pending[pool.submit(analyze_image, input_file_path, outout_dir_path, cached, m.args.debug_images, m.args.hexagon_search, m.args.decode_margin, True)] = (sha, cached is None)
+                    if not pending:
+                        break
+                    done, _ = concurrent.futures.wait(pending, return_when=concurrent.futures.FIRST_COMPLETED)
+                    for future in done:
+                        result = future.result()
+                        sha, searched = pending.pop(future)
+                        _add_result(result, sha, searched)
+                        if searched:
+                            searching.discard(sha)
+                            ready.extend( (input_file_path, sha) for input_file_path in waiting.pop(sha, []) )
+                        print(result["log"], end="")
+                        print(f"@@ [{len(results)} / {len(todo)}] {result['input']} in {'%.2f' % result['elapsed']} s")
+            return results
+        finally:
+            cache.save()
 
     def generate_solutions(self, outout_dir_path:str, gen_output_name:str) -> Generator:
         g = Generator(outout_dir_path)
@@ -72,7 +210,12 @@ class Main:
             if m.args.gen_index < 0 or m.args.gen_index >= m.args.gen_cores:
                 print(f"Error: --gen-index must be in range 0..{m.args.gen_cores-1}")
                 sys.exit(1)
-        g.generate(gen_output_name, m.args.overwrite, m.args.gen_cores, m.args.gen_index, m.args.gen_start)
+        if m.args.gen_symmetry != "full" and m.args.gen_solver == "perm":
+            print("Error: --gen-symmetry requires --gen-solver dlx or cells")
+            sys.exit(1)
+        jobs = m.args.jobs or os.cpu_count()
+        g.generate(gen_output_name, m.args.overwrite, m.args.gen_cores, m.args.gen_index, m.args.gen_start, m.args.gen_placements, m.args.gen_solver, jobs, m.args.resume, m.args.gen_symmetry, m.args.gen_mode, m.args.gen_memo,
+                   m.args.gen_metrics, m.args.gen_metrics_interval, m.args.gen_metrics_port)
         return g
 
     def generate_pieces_stats(self, outout_dir_path:str, output_prefix:str, solutions_file:str) -> dict:
@@ -80,6 +223,20 @@ class Main:
         stats = g.generate(solutions_file)
         return stats
 
+    def merge_solutions(self, output_dir:str, output_name:str, shard_paths:list) -> None:
+        bin_path = os.path.join(output_dir, output_name)
+        if os.path.exists(bin_path):
+            if not m.args.overwrite:
+                print(f"Error: {bin_path} already exists (use -y to overwrite)")
+                sys.exit(1)
+            os.remove(bin_path)
+        stats = Generator(output_dir).merge_solutions(shard_paths, bin_path)
+        stats_path = os.path.splitext(bin_path)[0] + ".json"
+        with open(stats_path, "w") as f:
+            f.write(json.dumps(stats, indent=2))
+        print(f"Merged {stats['solutions']} solutions from {len(shard_paths)} files: {stats['unique']} unique, {stats['duplicates']} duplicates")
+        print(f"Generated {bin_path} and {stats_path}")
+
     def write_stats_index(self, output_dir:str, stats:dict) -> None:
         found_path = os.path.join(output_dir, "pieces_stats.json")
         with open(found_path, "w") as f:
@@ -119,15 +276,21 @@ class Main:
         print(f"Generated index at {index_path}")
         print(stats_str.replace("<br/>", ""))
 
-    def write_analyzer_index(self, output_dir:str) -> None:
+    def write_analyzer_index(self, output_dir:str, results:list=None) -> None:
+        """
+        Writes the index of all the analyzed images found in the output dir.
+        The optional results of analyze_files() add the processing errors of this run.
+        """
         img_infos = [] # dict: basename=str, src=path, alt=list[path]
         max_columns = 1
+        errors = { r["basename"]: r["error"] for r in results or [] if r["error"] }
 
         stats = {
             "num_img": 0,
             "num_sig": 0,
             "num_unique": 0,
             "num_dups": 0,
+            "num_errors": len(errors),
         }
         name_to_sig = {}
         sig_counts = {}
@@ -173,13 +336,15 @@ class Main:
         Processed successfully: {stats['num_sig']} <br/>
         Failed to process: {stats['num_img'] - stats['num_sig']} <br/>
         Unique images: {stats['num_unique']} <br/>
-        Duplicated images: {stats['num_dups']}
+        Duplicated images: {stats['num_dups']} <br/>
+        Processing errors: {stats['num_errors']}
         """
         stats_dict = {
             "num_img": stats["num_img"],
             "num_sig": stats["num_sig"],
             "num_unique": stats["num_unique"],
-            "num_dups": stats["num_dups"]
+            "num_dups": stats["num_dups"],
+            "num_errors": stats["num_errors"],
         }
 
         # Generate HTML table
@@ -193,7 +358,7 @@ class Main:
             name = info["basename"]
             rows += f"  <td colspan={max_columns} id='{name}'><a href='#{name}'>{n} - {name}</a></td>\n"
             rows += "</tr>\n"
-            sig = name_to_sig.get(info["basename"], "Failed to process")
+            sig = name_to_sig.get(info["basename"], errors.get(info["basename"], "Failed to process"))
             sig_count = sig_counts.get(sig, 0)
             sig_class = "dup" if sig_count > 1 else (
                 "err" if sig_count == 0 else "ok")
@@ -243,7 +408,18 @@ if __name__ == "__main__":
     m.parse_arguments()
     if m.args.overwrite:
         print("Will overwrite existing files")
-    if m.args.pieces:
+    if m.args.convert_solutions:
+        bin_path = os.path.splitext(m.args.convert_solutions)[0] + ".bin"
+        if os.path.exists(bin_path) and not m.args.overwrite:
+            print(f"Error: {bin_path} already exists (use -y to overwrite)")
+            sys.exit(1)
+        if os.path.exists(bin_path):
+            os.remove(bin_path)
+        count = convert_solutions(m.args.convert_solutions, bin_path)
+        print(f"Converted {count} solutions to {bin_path}")
+    elif m.args.merge_solutions:
+        m.merge_solutions(m.args.output_dir, m.args.merge_output, m.args.merge_solutions)
+    elif m.args.pieces:
         s = m.generate_pieces_stats(m.args.output_dir, "pieces", m.args.pieces_solutions)
         m.write_stats_index(m.args.output_dir, s)
     elif m.args.generate:
@@ -253,9 +429,8 @@ if __name__ == "__main__":
         m.analyze_file(m.args.input_image, m.args.output_dir)
     elif m.args.input_dir:
         inputs = m.find_files(m.args.input_dir)
-        for f in inputs:
-            m.analyze_file(f, m.args.output_dir)
-        m.write_analyzer_index(m.args.output_dir)
+        results = m.analyze_files(inputs, m.args.output_dir, m.args.jobs or os.cpu_count())
+        m.write_analyzer_index(m.args.output_dir, results)
     else:
         print("No input file (-i) or directory specified (-d).")
 
@@ -21,15 +21,24 @@ class MainTest(unittest.TestCase):
         # with self.assertRaises(SystemExit): self.main.parse_arguments()
         self.main.parse_arguments()
         sep = os.sep
-        self.assertEqual(self.main.args.dir_input, f"data{sep}originals")
-        self.assertEqual(self.main.args.dir_output, f"data{sep}output")
+        self.assertEqual(self.main.args.input_dir, None)
+        self.assertEqual(self.main.args.output_dir, f"data{sep}output")
 
     def test_parse_arguments_with_args(self):
-        test_args = ["main.py", "--dir-input", "somedir/inputs", "--dir-output", "somedir/outputs"]
+        test_args = ["main.py", "--input-dir", "somedir/inputs", "--output-dir", "somedir/outputs"]
         sys.argv = test_args
         self.main.parse_arguments()
-        self.assertEqual(self.main.args.dir_input, "somedir/inputs")
-        self.assertEqual(self.main.args.dir_output, "somedir/outputs")
+        self.assertEqual(self.main.args.input_dir, "somedir/inputs")
+        self.assertEqual(self.main.args.output_dir, "somedir/outputs")
+
+    def test_parse_arguments_generator(self):
+        test_args = ["main.py", "-g", "--gen-solver", "cells", "--gen-mode", "count", "-j", "4"]
+        sys.argv = test_args
+        self.main.parse_arguments()
+        self.assertTrue(self.main.args.generate)
+        self.assertEqual(self.main.args.gen_solver, "cells")
+        self.assertEqual(self.main.args.gen_mode, "count")
+        self.assertEqual(self.main.args.jobs, 4)
 
 
 if __name__ == "__main__":
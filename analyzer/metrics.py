@@ -0,0 +1,159 @@
+# Tangram Puzzle: Generator Metrics
+#
+# (c) 2025 ralfoide at gmail
+
+import http.server
+import json
+import threading
+import time
+
+# Default interval in seconds between two samples of the generator counters.
+GEN_METRICS_INTERVAL = 10
+
+# Generator counters of each pruning rule, by rule name, counted with and without __debug__.
+PRUNE_COUNTERS = {
+    "g_count": "reject_g_count",
+    "yrg_invalid": "reject_yrg_invalid",
+    "occupied": "reject_occupied",
+    "adjacents": "reject_adjacents",
+    "dead_region": "reject_dead_region",
+}
+
+
+class GenMetrics:
+    """
+    Samples the counters of a running Generator from a background thread: nodes/s,
+    solutions/s, rejections per pruning rule, nodes per search depth, and the ETA from
+    the progress in permutations or tasks.
+    The search itself only increments plain counters, so the cost does not depend on
+    the sampling interval. Each sample is appended as a JSON line to the metrics file,
+    and the last sample is served as JSON on http://localhost:port/ when port is set.
+    """
+    def __init__(self, generator, path:str=None, interval:float=GEN_METRICS_INTERVAL, port:int=0):
+        self.generator = generator
+        self.path = path
+        self.interval = interval
+        self.port = port
+        self.last = {}
+        self.start_ts = 0
+        self.start_counters = None
+        self.prev_ts = 0
+        self.prev_counters = None
+        self.stop_event = threading.Event()
+        self.thread = None
+        self.server = None
+
+    def counters(self) -> dict:
+        g = self.generator
+        counters = {
+            "nodes": g.gen_count,
+            "solutions": g.report_count,
+            "progress": g.progress_done,
+        }
+        for rule, name in PRUNE_COUNTERS.items():
+            counters[rule] = getattr(g, name)
+        return counters
+
+    def start(self) -> None:
+        self.start_ts = self.prev_ts = time.time()
+        self.start_counters = self.prev_counters = self.counters()
+        self.last = self.sample()
+        if self.port:
+            self.server = http.server.ThreadingHTTPServer(("localhost", self.port), self._handler())
+            threading.Thread(target=self.server.serve_forever, daemon=True).start()
+            print(f"@@ Metrics: http://localhost:{self.server.server_address[1]}/")
+        if self.path:
+            print(f"@@ Metrics: {self.path}")
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def stop(self) -> None:
+        """Stops the sampling thread and the HTTP endpoint, after writing a last sample."""
+        self.stop_event.set()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
+
+    def _run(self) -> None:
+        while not self.stop_event.wait(self.interval):
+            self.write(self.sample())
+        self.write(self.sample())
+
+    def write(self, sample:dict) -> None:
+        if self.path:
+            with open(self.path, "a") as f:
+                f.write(json.dumps(sample))
+                f.write("\n")
+
+    def sample(self) -> dict:
+        """
+        Returns the current metrics. Rates are given both since the start ("avg") and
+        since the previous sample ("cur"). The ETA is extrapolated from the average
+        progress rate.
+        """
+        g = self.generator
+        ts = time.time()
+        counters = self.counters()
+        elapsed = ts - self.start_ts
+        delta = ts - self.prev_ts
+
+        def _rates(name:str) -> dict:
+            return {
+                "avg": (counters[name] - self.start_counters[name]) / elapsed if elapsed > 0 else 0,
+                "cur": (counters[name] - self.prev_counters[name]) / delta if delta > 0 else 0,
+            }
+
+        done = counters["progress"]
+        total = g.progress_total
+        eta = None
+        progress_rate = _rates("progress")["avg"]
+        if total and progress_rate > 0:
+            eta = (total - done) / progress_rate
+
+        nodes = counters["nodes"] - self.start_counters["nodes"]
+        prune = {}
+        for rule in PRUNE_COUNTERS:
+            count = counters[rule] - self.start_counters[rule]
+            prune[rule] = {
+                "count": counters[rule],
+                "rate": count / nodes if nodes > 0 else 0,
+            }
+
+        sample = {
+            "ts": ts,
+            "elapsed": elapsed,
+            "nodes": counters["nodes"],
+            "nodes_per_sec": _rates("nodes"),
+            "solutions": counters["solutions"],
+            "solutions_per_sec": _rates("solutions"),
+            "progress": { "done": done, "total": total },
+            "eta_sec": eta,
+            "prune": prune,
+            "depth_nodes": list(g.depth_nodes),
+            "memo": { "hits": g.memo_hits, "misses": g.memo_misses, "size": len(g.memo), "bytes": g.memo_bytes },
+        }
+        self.prev_ts = ts
+        self.prev_counters = counters
+        self.last = sample
+        return sample
+
+    def _handler(self) -> type:
+        metrics = self
+
+        class _Handler(http.server.BaseHTTPRequestHandler):
+            def do_GET(self):
+                body = json.dumps(metrics.last).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        return _Handler
@@ -13,7 +13,7 @@ import time
 
 from coord import Axis, XY, YRG, YRGCoord
 from img_proc import Cell
-from gen import Generator, Cells, PIECES, EMPTY_CELL, INVALID_CELL
+from gen import Generator, Cells, PIECES, EMPTY_CELL, INVALID_CELL, SolutionsReader, decode_placed
 from typing import Tuple
 import re
 
@@ -52,6 +52,8 @@ class PiecesStats:
         return stats
 
     def read_solutions(self, solutions_file: str) -> dict:
+        if solutions_file.endswith(".bin"):
+            return self.read_solutions_store(solutions_file)
         solutions = {}
         visited = set()
         # Extract the solution out of a string such as
@@ -60,7 +62,7 @@ class PiecesStats:
         re_solution = re.compile(r"([B-Yi12]{2})@([0-9]+):([0-9]+)x([0-9]+)x([0-9]+)")
         print("@@ Reading", solutions_file)
         with open(solutions_file, "r") as f:
-            for line in f.readlines():
+            for line in f:
                 match = re_solutions.search(line)
                 if match:
                     solutions_str = match.group(1)
@@ -84,20 +86,38 @@ class PiecesStats:
                                 y = int(match.group(3))
                                 r = int(match.group(4))
                                 g = int(match.group(5))
-                                entry = {
-                                    "key": f"{piece}@{angle}",  # e.g. "i1@0"
-                                    "piece": piece,             # e.g. "i1"
-                                    "angle": angle,             # e.g. 0  
-                                    "y": y,
-                                    "r": r,
-                                    "g": g,
-                                    "count": 1
-                                }
-                                solutions[solution_str] = entry
+                                solutions[solution_str] = self.placement_entry(piece, angle, y, r, g, 1)
 
         print("@@ Parsed", len(visited), "unique solutions with", len(solutions), "unique pieces")
         return len(visited), solutions
 
+    def read_solutions_store(self, solutions_file: str) -> dict:
+        """
+        Same as read_solutions() for a binary solution store (.bin), counted on its records.
+        Each solution is a row of encoded placements, sorted to check their uniqueness.
+        """
+        print("@@ Reading", solutions_file)
+        records = SolutionsReader(solutions_file).records
+        unique_placed = np.unique(np.sort(records["placed"], axis=1), axis=0)
+        values, counts = np.unique(unique_placed, return_counts=True)
+        solutions = {}
+        for (piece, angle, y, r, g), count in zip(decode_placed(values.tolist()), counts.tolist()):
+            solutions[f"{piece}@{angle}:{y}x{r}x{g}"] = self.placement_entry(piece, angle, y, r, g, count)
+
+        print("@@ Parsed", len(unique_placed), "unique solutions with", len(solutions), "unique pieces")
+        return len(unique_placed), solutions
+
+    def placement_entry(self, piece: str, angle: int, y: int, r: int, g: int, count: int) -> dict:
+        return {
+            "key": f"{piece}@{angle}",  # e.g. "i1@0"
+            "piece": piece,             # e.g. "i1"
+            "angle": angle,             # e.g. 0
+            "y": y,
+            "r": r,
+            "g": g,
+            "count": count
+        }
+
     def count_pieces_statistics(self, stats: dict, num_unique_solutions: int, solutions: dict) -> None:
         sums = {}
         stats["sums"] = sums